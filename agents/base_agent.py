@@ -2,8 +2,128 @@
 Base agent class that all agents inherit from.
 """
 from abc import ABC, abstractmethod
-from typing import Dict, Any, Optional
+from dataclasses import dataclass, field
+from typing import Dict, Any, Optional, List, Mapping, Sequence, Callable, Awaitable
 from loguru import logger
+from config import CONFIG
+import asyncio
+import hashlib
+import orjson
+import re
+
+# Shared across agents so parallel steps cannot exceed the API rate limit
+_OPENAI_SEM = asyncio.Semaphore(CONFIG.OPENAI_MAX_CONCURRENCY)
+# Identical OpenAI requests currently in flight, keyed by request hash
+_INFLIGHT: Dict[str, asyncio.Future] = {}
+
+
+def _request_key(*parts: Any) -> str:
+    """Hash OpenAI request arguments into a coalescing key."""
+    return hashlib.sha256(orjson.dumps(parts, option=orjson.OPT_SORT_KEYS)).hexdigest()
+
+
+async def _coalesced(key: str, call: Callable[[], Awaitable[Any]]) -> Any:
+    """Run an OpenAI call under the shared semaphore, sharing its result
+    with any identical request issued while it is still in flight.
+    
+    If the request that issued the call is cancelled, the requests waiting on
+    it issue the call again instead of being cancelled with it."""
+    inflight = _INFLIGHT.get(key)
+    if inflight is not None:
+        try:
+            return await asyncio.shield(inflight)
+        except asyncio.CancelledError:
+            if not inflight.cancelled() or asyncio.current_task().cancelling():
+                raise
+            return await _coalesced(key, call)
+    
+    future = asyncio.get_running_loop().create_future()
+    _INFLIGHT[key] = future
+    try:
+        async with _OPENAI_SEM:
+            result = await call()
+    except asyncio.CancelledError:
+        future.cancel()
+        raise
+    except Exception as e:
+        future.set_exception(e)
+        future.exception()  # Mark retrieved; waiters still re-raise it
+        raise
+    else:
+        future.set_result(result)
+        return result
+    finally:
+        _INFLIGHT.pop(key, None)
+
+
+def parse_json_text(text: str) -> Any:
+    """Parse JSON returned by an LLM, tolerating markdown code fences."""
+    text = text.strip()
+    if text.startswith("```"):
+        text = text.split("```")[1]
+        if text.startswith("json"):
+            text = text[4:]
+    return orjson.loads(text.strip())
+
+
+def _extract_string_fields(text: str, keys: Sequence[str]) -> Optional[Dict[str, Any]]:
+    """Extract completed top-level string (or null) values from partial JSON.
+    
+    Returns None until every key in keys has a fully streamed value.
+    """
+    fields = {}
+    for key in keys:
+        match = re.search(r'"%s"\s*:\s*("(?:[^"\\]|\\.)*"|null)' % re.escape(key), text)
+        if not match:
+            return None
+        fields[key] = orjson.loads(match.group(1))
+    return fields
+
+
+@dataclass(slots=True, frozen=True)
+class AgentResult:
+    """Outcome of an agent action.
+    
+    Supports read-only dict-style access (result["status"], result.get("data"))
+    so callers written against the old result dicts keep working; use
+    to_dict() only where a real dict is needed.
+    """
+    status: str
+    data: Dict[str, Any] = field(default_factory=dict)
+    message: str = ""
+    
+    @classmethod
+    def success(cls, data: Optional[Dict[str, Any]] = None, message: str = "") -> "AgentResult":
+        return cls("success", data if data is not None else {}, message)
+    
+    @classmethod
+    def error(cls, message: str, data: Optional[Dict[str, Any]] = None) -> "AgentResult":
+        return cls("error", data if data is not None else {}, message)
+    
+    def __getitem__(self, key: str) -> Any:
+        if key not in self.__dataclass_fields__:
+            raise KeyError(key)
+        return getattr(self, key)
+    
+    def get(self, key: str, default: Any = None) -> Any:
+        return getattr(self, key) if key in self.__dataclass_fields__ else default
+    
+    def to_dict(self) -> Dict[str, Any]:
+        """Convert to a plain dict, including nested results."""
+        return {"status": self.status, "data": _to_plain(self.data), "message": self.message}
+
+
+def _to_plain(value: Any) -> Any:
+    """Recursively replace AgentResult instances and read-only mappings
+    (e.g. MappingProxyType plans) with plain dicts."""
+    if isinstance(value, AgentResult):
+        return value.to_dict()
+    if isinstance(value, Mapping):
+        return {k: _to_plain(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_to_plain(v) for v in value]
+    return value
+
 
 class BaseAgent(ABC):
     """Base class for all agents in the system."""
@@ -34,8 +154,94 @@ class BaseAgent(ABC):
         """
         pass
     
-    def log(self, message: str, level: str = "info"):
-        """Log a message with the agent's context."""
+    async def cached_completion(self, **kwargs) -> Any:
+        """
+        Create a chat completion, capped by the shared concurrency limit.
+        
+        Identical requests already in flight share a single API call.
+        
+        Args:
+            **kwargs: Arguments for chat.completions.create
+            
+        Returns:
+            The chat completion response
+        """
+        return await _coalesced(
+            _request_key(kwargs),
+            lambda: self.openai_client.chat.completions.create(**kwargs)
+        )
+    
+    async def cached_embedding(self, model: str, text: str, **kwargs) -> List[float]:
+        """
+        Embed text, capped by the shared concurrency limit.
+        
+        Identical requests already in flight share a single API call.
+        
+        Args:
+            model: Embedding model name
+            text: Text to embed
+            **kwargs: Extra arguments for embeddings.create
+            
+        Returns:
+            The embedding vector
+        """
+        response = await _coalesced(
+            _request_key("embedding", model, text, kwargs),
+            lambda: self.openai_client.embeddings.create(model=model, input=text, **kwargs)
+        )
+        return response.data[0].embedding
+    
+    async def stream_json_completion(self, messages: List[Dict[str, str]], required_keys: Sequence[str] = (), **kwargs) -> Any:
+        """Stream a chat completion and parse its JSON body.
+        
+        Args:
+            messages: Chat messages for the completion
+            required_keys: If given, return as soon as each of these keys has a
+                           complete string value and close the stream early;
+                           the result then contains only these keys
+            **kwargs: Extra arguments for chat.completions.create
+            
+        Returns:
+            The parsed JSON value
+        """
+        async def call() -> Any:
+            stream = await self.openai_client.chat.completions.create(
+                messages=messages,
+                stream=True,
+                **kwargs
+            )
+            parts = []
+            try:
+                async for chunk in stream:
+                    delta = chunk.choices[0].delta.content if chunk.choices else None
+                    if not delta:
+                        continue
+                    parts.append(delta)
+                    if required_keys and '"' in delta:
+                        fields = _extract_string_fields("".join(parts), required_keys)
+                        if fields is not None:
+                            return fields
+            finally:
+                await stream.close()
+            return parse_json_text("".join(parts))
+        
+        return await _coalesced(_request_key(messages, list(required_keys), kwargs), call)
+    
+    def log(self, message: str, level: str = "info", **fields):
+        """
+        Log a message with the agent's context.
+        
+        Keyword fields are attached to the record's extra dict and fill
+        "{name}" placeholders in the message; formatting only happens if a
+        sink accepts the level.
+        """
         log_func = getattr(self.logger, level.lower(), self.logger.info)
-        log_func(message)
+        log_func(message, **fields)
+    
+    def log_lazy(self, message: str, level: str = "debug", **fields: Callable[[], Any]):
+        """Like log(), but each field is a zero-argument callable that is only
+        evaluated if the record is emitted (for values costly to render)."""
+        lazy_logger = self.logger.opt(lazy=True)
+        log_func = getattr(lazy_logger, level.lower(), lazy_logger.debug)
+        log_func(message, **fields)
 
@@ -1,11 +1,140 @@
 """
 Cart and Checkout Agent - Handles adding to cart and checkout process.
 """
-from typing import Dict, Any, Optional
-from agents.base_agent import BaseAgent
+from typing import Dict, Any, Optional, Tuple, Callable, Awaitable
+from collections import OrderedDict
+from urllib.parse import urlparse, urljoin
+from agents.base_agent import BaseAgent, AgentResult
 from agents.web_navigator import WebNavigatorAgent
-from config import Config
+from config import CONFIG
 import asyncio
+import hashlib
+import orjson
+import re
+import time
+
+# Response cache for LLM-derived selector strategies, shared by all instances.
+# Keyed by (kind, domain, normalized element list) so the same page template
+# on a domain reuses the previous answer instead of calling OpenAI again.
+_STRATEGY_CACHE_TTL = 3600  # seconds
+_STRATEGY_CACHE_MAX_SIZE = 256
+_strategy_cache: "OrderedDict[str, Tuple[Dict[str, Any], float]]" = OrderedDict()
+_strategy_locks: Dict[str, asyncio.Lock] = {}
+
+# Cache-key normalization patterns, compiled once at import and shared by
+# every instance: per-request tokens that change between otherwise identical
+# pages (CSRF tokens, nonces, cache busters, timestamps, cart counts) and
+# whitespace runs.
+_DYNAMIC_TOKEN_RE = re.compile(
+    r'(csrf[-_]?token["\']?\s*[:=]\s*["\']?[\w-]+'
+    r'|nonce["\']?\s*[:=]\s*["\']?[\w-]+'
+    r'|timestamp=\d+'
+    r'|[?&]_=\d+'
+    r'|cart[-_]?count["\']?\s*[:=]\s*["\']?\d+'
+    r'|cart\s*\(\d+\))',
+    re.IGNORECASE
+)
+_WHITESPACE_RE = re.compile(r'\s+')
+
+# Static prompt prefixes. Dynamic data (URL, HTML) is appended at the very end
+# so the leading tokens stay byte-identical across calls and qualify for
+# OpenAI's automatic prompt-prefix caching.
+_ADD_TO_CART_SYSTEM_PROMPT = "You are an expert at analyzing e-commerce pages. Return only valid JSON."
+_ADD_TO_CART_INSTRUCTIONS = """Analyze the page's interactive elements and determine how to add a product to cart.
+Return a JSON object with:
+- add_to_cart_selector: CSS selector for the "Add to Cart" button
+- cart_button_selector: CSS selector for the cart icon/button (if needed to view cart)
+- checkout_button_selector: CSS selector for the checkout button (if visible)
+
+Return only valid JSON. If elements are not found, use common selectors like:
+- button:contains("Add to Cart"), button:contains("Add to Bag"), [data-testid*="add-to-cart"]
+- a:contains("Cart"), [aria-label*="cart"]
+- button:contains("Checkout"), button:contains("Buy Now")"""
+
+_CHECKOUT_FORM_SYSTEM_PROMPT = "You are an expert at analyzing forms. Return only valid JSON."
+_CHECKOUT_FORM_INSTRUCTIONS = """Analyze the page's form fields and determine CSS selectors for checkout form fields.
+Return a JSON object with selectors for:
+- email: Email input field
+- first_name: First name input field
+- last_name: Last name input field
+- address: Address input field
+- city: City input field
+- zip: ZIP/Postal code input field
+- phone: Phone input field
+- continue_button: Continue/Next button
+
+Return only valid JSON."""
+
+# Full user-message templates: static instructions first, page data last
+_ADD_TO_CART_PROMPT_TEMPLATE = _ADD_TO_CART_INSTRUCTIONS + "\n\nCurrent URL: {url}\nInteractive elements (JSON): {elements}"
+_CHECKOUT_FORM_PROMPT_TEMPLATE = _CHECKOUT_FORM_INSTRUCTIONS + "\n\nForm fields (JSON): {fields}"
+
+# Candidate selectors, shared across instances instead of rebuilt per call.
+# Native CSS only: these run through document.querySelector in the page.
+_IN_PAGE_ADD_TO_CART_SELECTORS = (
+    "[data-testid*='add-to-cart']",
+    "button[aria-label*='Add to Cart']",
+    "button[name='add-to-cart']",
+    ".add-to-cart",
+    "#add-to-cart"
+)
+_ADD_TO_CART_SELECTORS = (
+    "button:has-text('Add to Cart')",
+    "button:has-text('Add to Bag')",
+    "[data-testid*='add-to-cart']",
+    "button[aria-label*='Add to Cart']",
+    ".add-to-cart",
+    "#add-to-cart"
+)
+_CART_SELECTORS = (
+    "a:has-text('Cart')",
+    "[aria-label*='cart']",
+    ".cart-icon",
+    "#cart",
+    "a[href*='cart']"
+)
+_CHECKOUT_SELECTORS = (
+    "button:has-text('Checkout')",
+    "button:has-text('Proceed to Checkout')",
+    "a:has-text('Checkout')",
+    "[data-testid*='checkout']",
+    "button[aria-label*='checkout']"
+)
+_ORDER_SELECTORS = (
+    "button:has-text('Place Order')",
+    "button:has-text('Complete Order')",
+    "button:has-text('Buy Now')",
+    "[data-testid*='place-order']",
+    "button[type='submit']:has-text('Order')"
+)
+
+# Common cart page paths probed speculatively during full_checkout
+_CART_PATH_CANDIDATES = ("/cart", "/shopping-cart", "/basket", "/bag")
+
+# Elements that show up once the cart has been updated
+_CART_BADGE_SELECTOR = "[data-testid*='cart-count'], .cart-count, [aria-label*='cart' i] [class*='count']"
+
+# Standard autocomplete tokens mapped to user_info keys. Well-formed checkout
+# forms expose these, which lets the field mapping skip the LLM entirely.
+_AUTOCOMPLETE_FIELD_MAP = {
+    "email": "email",
+    "given-name": "first_name",
+    "family-name": "last_name",
+    "street-address": "address",
+    "address-line1": "address",
+    "address-level2": "city",
+    "postal-code": "zip",
+    "tel": "phone",
+}
+_MIN_AUTOCOMPLETE_FIELDS = 4  # of the 7 user_info fields
+
+
+def _strategy_cache_key(kind: str, url: str, content: str) -> str:
+    """Build a cache key from the page domain and its normalized content."""
+    domain = urlparse(url).netloc
+    normalized = _WHITESPACE_RE.sub(" ", _DYNAMIC_TOKEN_RE.sub("", content))
+    return hashlib.sha256(f"{kind}|{domain}|{normalized}".encode("utf-8")).hexdigest()
+
 
 class CartCheckoutAgent(BaseAgent):
     """Agent responsible for cart operations and checkout process."""
@@ -14,44 +143,62 @@ class CartCheckoutAgent(BaseAgent):
         super().__init__("CartCheckout", openai_client)
         self.web_navigator = web_navigator
     
+    async def _get_cached_strategy(self, key: str, fetch: Callable[[], Awaitable[Dict[str, Any]]]) -> Dict[str, Any]:
+        """Return a cached strategy for key, or fetch and cache it.
+        
+        Concurrent misses on the same key share one fetch via a per-key lock.
+        """
+        cached = _strategy_cache.get(key)
+        if cached and cached[1] > time.monotonic():
+            _strategy_cache.move_to_end(key)
+            self.log("Using cached selector strategy")
+            return dict(cached[0])
+        
+        lock = _strategy_locks.setdefault(key, asyncio.Lock())
+        try:
+            async with lock:
+                cached = _strategy_cache.get(key)
+                if cached and cached[1] > time.monotonic():
+                    return dict(cached[0])
+                
+                strategy = await fetch()
+                _strategy_cache[key] = (strategy, time.monotonic() + _STRATEGY_CACHE_TTL)
+                _strategy_cache.move_to_end(key)
+                while len(_strategy_cache) > _STRATEGY_CACHE_MAX_SIZE:
+                    _strategy_cache.popitem(last=False)
+                return dict(strategy)
+        finally:
+            if not lock.locked():
+                _strategy_locks.pop(key, None)
+    
     async def find_add_to_cart_strategy(self, current_url: str) -> Dict[str, Any]:
         """Determine how to add product to cart using OpenAI."""
         try:
-            page_content = await self.web_navigator.get_page_content()
-            content_preview = page_content[:5000] if len(page_content) > 5000 else page_content
-            
-            prompt = f"""
-            Analyze the HTML content and determine how to add a product to cart.
-            Return a JSON object with:
-            - add_to_cart_selector: CSS selector for the "Add to Cart" button
-            - cart_button_selector: CSS selector for the cart icon/button (if needed to view cart)
-            - checkout_button_selector: CSS selector for the checkout button (if visible)
-            
-            Current URL: {current_url}
-            HTML Content (preview): {content_preview}
-            
-            Return only valid JSON. If elements are not found, use common selectors like:
-            - button:contains("Add to Cart"), button:contains("Add to Bag"), [data-testid*="add-to-cart"]
-            - a:contains("Cart"), [aria-label*="cart"]
-            - button:contains("Checkout"), button:contains("Buy Now")
-            """
-            
-            response = await self.openai_client.chat.completions.create(
-                model=Config.OPENAI_MODEL,
-                messages=[
-                    {"role": "system", "content": "You are an expert at analyzing e-commerce pages. Return only valid JSON."},
-                    {"role": "user", "content": prompt}
-                ],
-                temperature=0.3
-            )
-            
-            import json
-            strategy = json.loads(response.choices[0].message.content)
-            self.log(f"Add to cart strategy determined: {strategy}")
+            elements = await self.web_navigator.get_interactive_elements()
+            content_preview = orjson.dumps(elements).decode()
+            
+            prompt = _ADD_TO_CART_PROMPT_TEMPLATE.format(url=current_url, elements=content_preview)
+            
+            async def fetch() -> Dict[str, Any]:
+                # Only the add-to-cart selector is acted on, so stop streaming
+                # as soon as it is complete
+                return await self.stream_json_completion(
+                    [
+                        {"role": "system", "content": _ADD_TO_CART_SYSTEM_PROMPT},
+                        {"role": "user", "content": prompt}
+                    ],
+                    required_keys=("add_to_cart_selector",),
+                    model=CONFIG.OPENAI_MODEL,
+                    temperature=0.3
+                )
+            
+            cache_key = _strategy_cache_key("add_to_cart", current_url, content_preview)
+            strategy = await self._get_cached_strategy(cache_key, fetch)
+            self.log_lazy("Add to cart strategy determined: {strategy}", strategy=lambda: orjson.dumps(strategy).decode())
             return strategy
         
         except Exception as e:
-            self.log(f"Error finding add to cart strategy: {str(e)}", "error")
+            self.log("Error finding add to cart strategy: {error}", "error", error=e)
             # Fallback selectors
             return {
                 "add_to_cart_selector": "button:has-text('Add to Cart'), button:has-text('Add to Bag'), [data-testid*='add-to-cart']",
@@ -59,9 +206,23 @@ class CartCheckoutAgent(BaseAgent):
                 "checkout_button_selector": "button:has-text('Checkout'), button:has-text('Buy Now')"
             }
     
-    async def add_to_cart(self, product_selector: Optional[str] = None) -> Dict[str, Any]:
+    async def add_to_cart(self, product_selector: Optional[str] = None) -> AgentResult:
         """Add product to cart."""
         try:
+            # Fast path: search and click common add-to-cart buttons inside the
+            # page, skipping the HTML transfer and the OpenAI call entirely
+            in_page_selectors = _IN_PAGE_ADD_TO_CART_SELECTORS
+            if product_selector:
+                in_page_selectors = (product_selector, *in_page_selectors)
+            
+            if await self.web_navigator.find_and_click_candidates(in_page_selectors):
+                # The click already happened, so never fall through to another
+                # add-to-cart click; many sites have no badge matching the selector
+                if not await self.web_navigator.wait_for_stable(selector=_CART_BADGE_SELECTOR):
+                    self.log("No cart badge after in-page click, assuming the product was added", "warning")
+                self.log("Product added to cart successfully")
+                return AgentResult.success({"action": "add_to_cart"}, "Product added to cart")
+            
             current_url = await self.web_navigator.get_page_url()
             
             # Find add to cart strategy
@@ -70,119 +231,86 @@ class CartCheckoutAgent(BaseAgent):
             # Try to click add to cart button
             add_to_cart_selector = strategy.get("add_to_cart_selector", "")
             
-            # Try multiple common selectors
-            selectors_to_try = [
-                add_to_cart_selector,
-                "button:has-text('Add to Cart')",
-                "button:has-text('Add to Bag')",
-                "[data-testid*='add-to-cart']",
-                "button[aria-label*='Add to Cart']",
-                ".add-to-cart",
-                "#add-to-cart"
-            ]
-            
-            clicked = False
-            for selector in selectors_to_try:
-                if selector and await self.web_navigator.click(selector):
-                    clicked = True
-                    await asyncio.sleep(2)  # Wait for cart to update
-                    break
+            # Try the suggested selector together with common ones
+            clicked = await self.web_navigator.click_any((add_to_cart_selector, *_ADD_TO_CART_SELECTORS))
+            if clicked:
+                await self.web_navigator.wait_for_stable(selector=_CART_BADGE_SELECTOR)
             
             if not clicked:
-                return {
-                    "status": "error",
-                    "data": {},
-                    "message": "Could not find or click 'Add to Cart' button"
-                }
+                return AgentResult.error("Could not find or click 'Add to Cart' button")
             
             self.log("Product added to cart successfully")
-            return {
-                "status": "success",
-                "data": {"action": "add_to_cart"},
-                "message": "Product added to cart"
-            }
+            return AgentResult.success({"action": "add_to_cart"}, "Product added to cart")
         
         except Exception as e:
-            self.log(f"Error adding to cart: {str(e)}", "error")
-            return {
-                "status": "error",
-                "data": {},
-                "message": str(e)
-            }
+            self.log("Error adding to cart: {error}", "error", error=e)
+            return AgentResult.error(str(e))
+    
+    async def _prefetch_cart_url_pattern(self) -> Optional[str]:
+        """Guess the cart URL for the current site with HEAD requests.
+        
+        Candidates are probed concurrently through the page's request context
+        (sharing its cookies); the first candidate, in priority order, that
+        answers with a success status wins. Redirects are not followed, since
+        sites commonly redirect unknown paths to the home page.
+        """
+        page_url = await self.web_navigator.get_page_url()
+        if not page_url.startswith("http"):
+            return None
+        
+        async def probe(url: str) -> Optional[str]:
+            try:
+                response = await self.web_navigator.page.request.head(url, timeout=3000, max_redirects=0)
+                return url if response.ok else None
+            except Exception:
+                return None
+        
+        candidates = [urljoin(page_url, path) for path in _CART_PATH_CANDIDATES]
+        results = await asyncio.gather(*(probe(url) for url in candidates))
+        cart_url = next((url for url in results if url), None)
+        if cart_url:
+            self.log("Prefetched cart URL: {cart_url}", cart_url=cart_url)
+        return cart_url
     
-    async def navigate_to_cart(self) -> Dict[str, Any]:
-        """Navigate to the cart page."""
+    async def navigate_to_cart(self, cart_url: Optional[str] = None) -> AgentResult:
+        """Navigate to the cart page.
+        
+        Args:
+            cart_url: Known cart page URL; when given, navigate to it directly
+                      instead of looking for a cart button
+        """
         try:
-            # Try to find and click cart button
-            cart_selectors = [
-                "a:has-text('Cart')",
-                "[aria-label*='cart']",
-                ".cart-icon",
-                "#cart",
-                "a[href*='cart']"
-            ]
+            if cart_url and await self.web_navigator.navigate_to(cart_url):
+                self.log("Navigated to cart")
+                return AgentResult.success({"action": "navigate_to_cart", "url": cart_url}, "Navigated to cart")
             
-            for selector in cart_selectors:
-                if await self.web_navigator.click(selector):
-                    await asyncio.sleep(2)
-                    self.log("Navigated to cart")
-                    return {
-                        "status": "success",
-                        "data": {"action": "navigate_to_cart"},
-                        "message": "Navigated to cart"
-                    }
+            if await self.web_navigator.click_any(_CART_SELECTORS, triggers_navigation=True):
+                await self.web_navigator.wait_for_stable()
+                self.log("Navigated to cart")
+                return AgentResult.success({"action": "navigate_to_cart"}, "Navigated to cart")
             
-            return {
-                "status": "error",
-                "data": {},
-                "message": "Could not navigate to cart"
-            }
+            return AgentResult.error("Could not navigate to cart")
         
         except Exception as e:
-            self.log(f"Error navigating to cart: {str(e)}", "error")
-            return {
-                "status": "error",
-                "data": {},
-                "message": str(e)
-            }
+            self.log("Error navigating to cart: {error}", "error", error=e)
+            return AgentResult.error(str(e))
     
-    async def proceed_to_checkout(self) -> Dict[str, Any]:
+    async def proceed_to_checkout(self) -> AgentResult:
         """Proceed to checkout."""
         try:
-            # Try to find checkout button
-            checkout_selectors = [
-                "button:has-text('Checkout')",
-                "button:has-text('Proceed to Checkout')",
-                "a:has-text('Checkout')",
-                "[data-testid*='checkout']",
-                "button[aria-label*='checkout']"
-            ]
+            # Checkout paths vary by site, so wait for whatever navigation the
+            # click starts rather than for a URL pattern
+            if await self.web_navigator.click_any(_CHECKOUT_SELECTORS, triggers_navigation=True):
+                self.log("Proceeded to checkout")
+                return AgentResult.success({"action": "proceed_to_checkout"}, "Proceeded to checkout")
             
-            for selector in checkout_selectors:
-                if await self.web_navigator.click(selector):
-                    await asyncio.sleep(3)  # Wait for checkout page to load
-                    self.log("Proceeded to checkout")
-                    return {
-                        "status": "success",
-                        "data": {"action": "proceed_to_checkout"},
-                        "message": "Proceeded to checkout"
-                    }
-            
-            return {
-                "status": "error",
-                "data": {},
-                "message": "Could not find checkout button"
-            }
+            return AgentResult.error("Could not find checkout button")
         
         except Exception as e:
-            self.log(f"Error proceeding to checkout: {str(e)}", "error")
-            return {
-                "status": "error",
-                "data": {},
-                "message": str(e)
-            }
+            self.log("Error proceeding to checkout: {error}", "error", error=e)
+            return AgentResult.error(str(e))
     
-    async def fill_checkout_form(self, user_info: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    async def fill_checkout_form(self, user_info: Optional[Dict[str, Any]] = None) -> AgentResult:
         """Fill checkout form with user information."""
         try:
             if not user_info:
@@ -197,106 +325,84 @@ class CartCheckoutAgent(BaseAgent):
                     "phone": "1234567890"
                 }
             
-            # Use OpenAI to determine form field selectors
-            page_content = await self.web_navigator.get_page_content()
-            content_preview = page_content[:3000] if len(page_content) > 3000 else page_content
-            
-            prompt = f"""
-            Analyze the HTML content and determine CSS selectors for checkout form fields.
-            Return a JSON object with selectors for:
-            - email: Email input field
-            - first_name: First name input field
-            - last_name: Last name input field
-            - address: Address input field
-            - city: City input field
-            - zip: ZIP/Postal code input field
-            - phone: Phone input field
-            - continue_button: Continue/Next button
-            
-            HTML Content (preview): {content_preview}
+            # Map fields deterministically from autocomplete attributes first
+            autocomplete, submit_selector = await self.web_navigator.enumerate_autocomplete_inputs()
+            form_selectors = {}
+            for token, field in _AUTOCOMPLETE_FIELD_MAP.items():
+                if token in autocomplete:
+                    form_selectors.setdefault(field, autocomplete[token])
             
-            Return only valid JSON.
-            """
-            
-            response = await self.openai_client.chat.completions.create(
-                model=Config.OPENAI_MODEL,
-                messages=[
-                    {"role": "system", "content": "You are an expert at analyzing forms. Return only valid JSON."},
-                    {"role": "user", "content": prompt}
-                ],
-                temperature=0.3
-            )
-            
-            import json
-            form_selectors = json.loads(response.choices[0].message.content)
+            if len(form_selectors) >= _MIN_AUTOCOMPLETE_FIELDS:
+                self.log("Mapped {count} form fields from autocomplete attributes", count=len(form_selectors))
+                form_selectors["continue_button"] = submit_selector
+            else:
+                # Use OpenAI to determine form field selectors
+                fields = await self.web_navigator.get_interactive_elements(
+                    "input:not([type='hidden']), select, textarea, button[type='submit']"
+                )
+                content_preview = orjson.dumps(fields).decode()
+                
+                prompt = _CHECKOUT_FORM_PROMPT_TEMPLATE.format(fields=content_preview)
+                
+                async def fetch() -> Dict[str, Any]:
+                    return await self.stream_json_completion(
+                        [
+                            {"role": "system", "content": _CHECKOUT_FORM_SYSTEM_PROMPT},
+                            {"role": "user", "content": prompt}
+                        ],
+                        model=CONFIG.OPENAI_MODEL,
+                        temperature=0.3
+                    )
+                
+                current_url = await self.web_navigator.get_page_url()
+                cache_key = _strategy_cache_key("checkout_form", current_url, content_preview)
+                form_selectors = await self._get_cached_strategy(cache_key, fetch)
+            
+            # Fill all form fields in one browser call
+            targets = [
+                (field, selector, user_info[field])
+                for field, selector in form_selectors.items()
+                if field in user_info and selector
+            ]
+            missing = set(await self.web_navigator.fill_batch(
+                [(selector, value) for _, selector, value in targets]
+            ))
             
-            # Fill form fields
             filled_fields = []
-            for field, selector in form_selectors.items():
-                if field in user_info and selector:
-                    value = user_info[field]
-                    if await self.web_navigator.fill_input(selector, value):
-                        filled_fields.append(field)
-                        await asyncio.sleep(0.5)
+            for field, selector, value in targets:
+                # Fall back to a per-field fill for selectors the batch could not
+                # resolve (e.g. Playwright-only selector syntax)
+                if selector not in missing or await self.web_navigator.fill_input(selector, value):
+                    filled_fields.append(field)
             
-            self.log(f"Filled {len(filled_fields)} form fields")
+            self.log("Filled {count} form fields", count=len(filled_fields))
             
             # Click continue button if available
             if form_selectors.get("continue_button"):
-                await self.web_navigator.click(form_selectors["continue_button"])
-                await asyncio.sleep(2)
+                await self.web_navigator.click(form_selectors["continue_button"], triggers_navigation=True)
+                await self.web_navigator.wait_for_stable()
             
-            return {
-                "status": "success",
-                "data": {"filled_fields": filled_fields},
-                "message": f"Filled {len(filled_fields)} form fields"
-            }
+            return AgentResult.success({"filled_fields": filled_fields}, f"Filled {len(filled_fields)} form fields")
         
         except Exception as e:
-            self.log(f"Error filling checkout form: {str(e)}", "error")
-            return {
-                "status": "error",
-                "data": {},
-                "message": str(e)
-            }
+            self.log("Error filling checkout form: {error}", "error", error=e)
+            return AgentResult.error(str(e))
     
-    async def place_order(self) -> Dict[str, Any]:
+    async def place_order(self) -> AgentResult:
         """Place the final order."""
         try:
-            # Look for place order button
-            order_selectors = [
-                "button:has-text('Place Order')",
-                "button:has-text('Complete Order')",
-                "button:has-text('Buy Now')",
-                "[data-testid*='place-order']",
-                "button[type='submit']:has-text('Order')"
-            ]
-            
-            for selector in order_selectors:
-                if await self.web_navigator.click(selector):
-                    await asyncio.sleep(3)
-                    self.log("Order placed successfully")
-                    return {
-                        "status": "success",
-                        "data": {"action": "place_order"},
-                        "message": "Order placed successfully"
-                    }
+            if await self.web_navigator.click_any(_ORDER_SELECTORS):
+                await self.web_navigator.wait_for_stable(timeout=5000)
+                self.log("Order placed successfully")
+                return AgentResult.success({"action": "place_order"}, "Order placed successfully")
             
-            return {
-                "status": "error",
-                "data": {},
-                "message": "Could not find place order button. Note: Actual payment processing may require additional steps."
-            }
+            return AgentResult.error("Could not find place order button. Note: Actual payment processing may require additional steps.")
         
         except Exception as e:
-            self.log(f"Error placing order: {str(e)}", "error")
-            return {
-                "status": "error",
-                "data": {},
-                "message": str(e)
-            }
+            self.log("Error placing order: {error}", "error", error=e)
+            return AgentResult.error(str(e))
     
-    async def execute(self, task: Dict[str, Any], context: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    async def execute(self, task: Dict[str, Any], context: Optional[Dict[str, Any]] = None) -> AgentResult:
         """Execute cart/checkout task."""
         try:
             action = task.get("action")
@@ -305,7 +411,7 @@ class CartCheckoutAgent(BaseAgent):
                 return await self.add_to_cart(task.get("product_selector"))
             
             elif action == "navigate_to_cart":
-                return await self.navigate_to_cart()
+                return await self.navigate_to_cart(task.get("cart_url"))
             
             elif action == "proceed_to_checkout":
                 return await self.proceed_to_checkout()
@@ -320,21 +426,24 @@ class CartCheckoutAgent(BaseAgent):
                 # Complete checkout flow
                 results = []
                 
-                # Add to cart
+                # Add to cart while speculatively resolving the cart URL
+                prefetch = asyncio.create_task(self._prefetch_cart_url_pattern())
                 result = await self.add_to_cart()
                 results.append(result)
                 if result["status"] != "success":
-                    return {"status": "error", "data": {"steps": results}, "message": "Failed at add to cart step"}
+                    prefetch.cancel()
+                    return AgentResult.error("Failed at add to cart step", {"steps": results})
                 
-                # Navigate to cart
-                result = await self.navigate_to_cart()
+                # Navigate to cart (direct goto when the prefetch found the URL)
+                cart_url = await prefetch
+                result = await self.navigate_to_cart(cart_url)
                 results.append(result)
                 
                 # Proceed to checkout
                 result = await self.proceed_to_checkout()
                 results.append(result)
                 if result["status"] != "success":
-                    return {"status": "partial", "data": {"steps": results}, "message": "Reached checkout but may need manual completion"}
+                    return AgentResult("partial", {"steps": results}, "Reached checkout but may need manual completion")
                 
                 # Fill form (optional, may not be needed for all sites)
                 # result = await self.fill_checkout_form()
@@ -344,24 +453,12 @@ class CartCheckoutAgent(BaseAgent):
                 # result = await self.place_order()
                 # results.append(result)
                 
-                return {
-                    "status": "success",
-                    "data": {"steps": results},
-                    "message": "Checkout process initiated. Note: Final order placement may require payment information."
-                }
+                return AgentResult.success({"steps": results}, "Checkout process initiated. Note: Final order placement may require payment information.")
             
             else:
-                return {
-                    "status": "error",
-                    "data": {},
-                    "message": f"Unknown action: {action}"
-                }
+                return AgentResult.error(f"Unknown action: {action}")
         
         except Exception as e:
-            self.log(f"Error executing cart/checkout task: {str(e)}", "error")
-            return {
-                "status": "error",
-                "data": {},
-                "message": str(e)
-            }
+            self.log("Error executing cart/checkout task: {error}", "error", error=e)
+            return AgentResult.error(str(e))
 
@@ -1,88 +1,158 @@
 """
 Orchestrator Agent (Agent1) - Coordinates all other agents.
 """
-from typing import Dict, Any, Optional
+from typing import Dict, Any, Optional, List, Tuple, Mapping
+from functools import cached_property
+from types import MappingProxyType
 import asyncio
-from agents.base_agent import BaseAgent
+import math
+from agents.base_agent import BaseAgent, AgentResult
 from agents.web_navigator import WebNavigatorAgent
 from agents.product_search_agent import ProductSearchAgent
 from agents.cart_checkout_agent import CartCheckoutAgent
-from config import Config
+from config import CONFIG
+from openai import APIStatusError, RateLimitError
 from utils.action_tracker import ActionTracker
 from utils.script_generator import PlaywrightScriptGenerator
 import os
 from datetime import datetime
 
+# Static prompt prefix; the user query goes last so the leading tokens stay
+# identical across calls and qualify for OpenAI prompt-prefix caching.
+_PLAN_SYSTEM_PROMPT = "You are a task planning assistant. Return only valid JSON."
+_PLAN_INSTRUCTIONS = """Given a user query for web scraping and e-commerce tasks, create a step-by-step plan.
+The plan should include:
+1. Product search and identification
+2. Navigation to product page
+3. Adding to cart
+4. Checkout process (if requested)
+
+Return a JSON object with:
+- steps: Array of step objects, each with:
+  - step_number: Integer
+  - agent: "ProductSearch", "WebNavigator", or "CartCheckout"
+  - action: Description of the action
+  - expected_result: What should happen
+
+Return only valid JSON."""
+_PLAN_PROMPT_TEMPLATE = _PLAN_INSTRUCTIONS + "\n\nUser Query: {query}"
+
+# Fallback plan when planning fails; read-only so it can be shared as is
+_DEFAULT_PLAN: Mapping[str, Any] = MappingProxyType({
+    "steps": (
+        MappingProxyType({"step_number": 1, "agent": "ProductSearch", "action": "search_product", "expected_result": "Find product"}),
+        MappingProxyType({"step_number": 2, "agent": "CartCheckout", "action": "add_to_cart", "expected_result": "Add product to cart"}),
+        MappingProxyType({"step_number": 3, "agent": "CartCheckout", "action": "full_checkout", "expected_result": "Complete checkout"})
+    )
+})
+
+# Semantic plan cache shared across orchestrators: (unit-normalized query
+# embedding, plan) pairs. Similar queries map to the same plan shape, so a
+# nearest-neighbour hit replaces the planning completion with one embedding.
+_plan_cache: List[Tuple[List[float], Dict[str, Any]]] = []
+
+
+def _normalize_vector(vector: List[float]) -> List[float]:
+    """Scale a vector to unit length so dot products are cosine similarities."""
+    norm = math.sqrt(sum(x * x for x in vector)) or 1.0
+    return [x / norm for x in vector]
+
 class OrchestratorAgent(BaseAgent):
     """Main orchestrator agent that coordinates all other agents."""
     
     def __init__(self, openai_client):
         super().__init__("Orchestrator", openai_client)
+        self.log("Orchestrator agent initialized (sub-agents are created on first use)")
+    
+    # Sub-agents are created lazily so requests that fail validation never pay
+    # for constructing them
+    @cached_property
+    def action_tracker(self) -> ActionTracker:
+        return ActionTracker()
+    
+    @cached_property
+    def web_navigator(self) -> WebNavigatorAgent:
+        return WebNavigatorAgent(self.openai_client, self.action_tracker)
+    
+    @cached_property
+    def product_search(self) -> ProductSearchAgent:
+        return ProductSearchAgent(self.openai_client, self.web_navigator)
+    
+    @cached_property
+    def cart_checkout(self) -> CartCheckoutAgent:
+        return CartCheckoutAgent(self.openai_client, self.web_navigator)
+    
+    async def _embed_query(self, user_query: str) -> Optional[List[float]]:
+        """Embed the normalized user query for plan cache lookups.
         
-        # Initialize action tracker
-        self.action_tracker = ActionTracker()
-        
-        # Initialize sub-agents with action tracker
-        self.web_navigator = WebNavigatorAgent(openai_client, self.action_tracker)
-        self.product_search = ProductSearchAgent(openai_client, self.web_navigator)
-        self.cart_checkout = CartCheckoutAgent(openai_client, self.web_navigator)
-        
-        self.log("Orchestrator agent initialized with all sub-agents")
+        Goes through the shared OpenAI semaphore, so identical queries in
+        flight share one embedding request.
+        """
+        try:
+            normalized = " ".join(user_query.lower().split())
+            embedding = await self.cached_embedding(CONFIG.OPENAI_EMBEDDING_MODEL, normalized, timeout=10.0)
+            return _normalize_vector(embedding)
+        except Exception as e:
+            self.log("Could not embed query for plan cache: {error}", "warning", error=str(e)[:100])
+            return None
+    
+    def _lookup_cached_plan(self, embedding: List[float]) -> Optional[Dict[str, Any]]:
+        """Return the most similar cached plan above the similarity threshold."""
+        best_plan = None
+        best_score = CONFIG.PLAN_CACHE_SIMILARITY
+        for cached_embedding, plan in _plan_cache:
+            score = sum(a * b for a, b in zip(cached_embedding, embedding))
+            if score >= best_score:
+                best_plan, best_score = plan, score
+        if best_plan is not None:
+            self.log("Reusing cached task plan (similarity {similarity:.3f})", similarity=best_score)
+        return best_plan
     
-    async def plan_task(self, user_query: str) -> Dict[str, Any]:
-        """Create a task plan using OpenAI."""
+    async def plan_task(self, user_query: str) -> Mapping[str, Any]:
+        """Create a task plan, reusing a cached plan for similar queries."""
+        # With nothing cached the embedding is only needed to store the new
+        # plan, so it runs alongside the planning completion
+        embedding_task = asyncio.ensure_future(self._embed_query(user_query))
+        if _plan_cache:
+            embedding = await embedding_task
+            if embedding is not None:
+                cached_plan = self._lookup_cached_plan(embedding)
+                if cached_plan is not None:
+                    return cached_plan
+        
         try:
-            prompt = f"""
-            Given a user query for web scraping and e-commerce tasks, create a step-by-step plan.
-            The plan should include:
-            1. Product search and identification
-            2. Navigation to product page
-            3. Adding to cart
-            4. Checkout process (if requested)
-            
-            User Query: {user_query}
+            prompt = _PLAN_PROMPT_TEMPLATE.format(query=user_query)
             
-            Return a JSON object with:
-            - steps: Array of step objects, each with:
-              - step_number: Integer
-              - agent: "ProductSearch", "WebNavigator", or "CartCheckout"
-              - action: Description of the action
-              - expected_result: What should happen
-            
-            Return only valid JSON.
-            """
-            
-            response = await self.openai_client.chat.completions.create(
-                model=Config.OPENAI_MODEL,
-                messages=[
-                    {"role": "system", "content": "You are a task planning assistant. Return only valid JSON."},
+            plan = await self.stream_json_completion(
+                [
+                    {"role": "system", "content": _PLAN_SYSTEM_PROMPT},
                     {"role": "user", "content": prompt}
                 ],
+                model=CONFIG.OPENAI_MODEL,
                 temperature=0.3,
                 timeout=30.0
             )
-            
-            import json
-            plan = json.loads(response.choices[0].message.content)
-            self.log(f"Task plan created: {plan}")
+            self.log("Task plan created: {plan}", plan=plan)
+            embedding = await embedding_task
+            if embedding is not None:
+                _plan_cache.append((embedding, plan))
+                if len(_plan_cache) > CONFIG.PLAN_CACHE_MAX_SIZE:
+                    _plan_cache.pop(0)
             return plan
         
+        except RateLimitError:
+            self.log("API quota exceeded, using default plan", "warning")
+            return _DEFAULT_PLAN
+        except APIStatusError as e:
+            self.log("OpenAI API error {status} creating task plan, using default plan", "warning", status=e.status_code)
+            return _DEFAULT_PLAN
         except Exception as e:
-            error_msg = str(e)
-            if "429" in error_msg or "quota" in error_msg.lower():
-                self.log("API quota exceeded, using default plan", "warning")
-            else:
-                self.log(f"Error creating task plan: {error_msg}, using default plan", "warning")
-            # Return default plan
-            return {
-                "steps": [
-                    {"step_number": 1, "agent": "ProductSearch", "action": "search_product", "expected_result": "Find product"},
-                    {"step_number": 2, "agent": "CartCheckout", "action": "add_to_cart", "expected_result": "Add product to cart"},
-                    {"step_number": 3, "agent": "CartCheckout", "action": "full_checkout", "expected_result": "Complete checkout"}
-                ]
-            }
+            self.log("Error creating task plan: {error}, using default plan", "warning", error=e)
+            return _DEFAULT_PLAN
+        finally:
+            embedding_task.cancel()
     
-    async def execute_plan(self, plan: Dict[str, Any], user_query: str) -> Dict[str, Any]:
+    async def execute_plan(self, plan: Mapping[str, Any], user_query: str) -> AgentResult:
         """Execute the planned task step by step."""
         results = []
         context = {}
@@ -95,7 +165,7 @@ class OrchestratorAgent(BaseAgent):
                 agent_name = step.get("agent", "")
                 action = step.get("action", "")
                 
-                self.log(f"Executing step {step_num}: {agent_name} - {action}")
+                self.log("Executing step {step_num}: {agent_name} - {action}", step_num=step_num, agent_name=agent_name, action=action)
                 
                 # Route to appropriate agent
                 if agent_name == "ProductSearch":
@@ -138,11 +208,7 @@ class OrchestratorAgent(BaseAgent):
                     context["checkout_result"] = result
                 
                 else:
-                    result = {
-                        "status": "error",
-                        "data": {},
-                        "message": f"Unknown agent: {agent_name}"
-                    }
+                    result = AgentResult.error(f"Unknown agent: {agent_name}")
                 
                 results.append({
                     "step": step_num,
@@ -153,83 +219,74 @@ class OrchestratorAgent(BaseAgent):
                 
                 # Stop if critical step fails
                 if result.get("status") == "error" and step_num <= 2:
-                    self.log(f"Critical step {step_num} failed, stopping execution", "warning")
+                    self.log("Critical step {step_num} failed, stopping execution", "warning", step_num=step_num)
                     break
             
-            return {
-                "status": "success",
-                "data": {
-                    "steps_completed": len(results),
-                    "results": results,
-                    "context": context
-                },
-                "message": f"Completed {len(results)} steps"
-            }
+            return AgentResult.success({
+                "steps_completed": len(results),
+                "results": results,
+                "context": context
+            }, f"Completed {len(results)} steps")
         
         except Exception as e:
-            self.log(f"Error executing plan: {str(e)}", "error")
-            return {
-                "status": "error",
-                "data": {"results": results},
-                "message": str(e)
-            }
+            self.log("Error executing plan: {error}", "error", error=e)
+            return AgentResult.error(str(e), {"results": results})
+    
+    async def _init_browser_with_retry(self, max_retries: int = 3) -> bool:
+        """Initialize the browser, retrying a few times on failure."""
+        for attempt in range(max_retries):
+            try:
+                success = await self.web_navigator.initialize_browser(headless=CONFIG.BROWSER_HEADLESS)
+                if success:
+                    return True
+                if attempt < max_retries - 1:
+                    await asyncio.sleep(2)
+                    self.log("Retrying browser initialization (attempt {attempt}/{max_retries})", attempt=attempt + 2, max_retries=max_retries)
+            except Exception as e:
+                self.log("Browser initialization attempt {attempt} failed: {error}", "warning", attempt=attempt + 1, error=e)
+                if attempt < max_retries - 1:
+                    await asyncio.sleep(2)
+        return False
     
-    async def execute(self, task: Dict[str, Any], context: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    async def execute(self, task: Dict[str, Any], context: Optional[Dict[str, Any]] = None) -> AgentResult:
         """Execute the main orchestration task."""
         try:
             user_query = task.get("query", "")
             
             if not user_query:
-                return {
-                    "status": "error",
-                    "data": {},
-                    "message": "No query provided"
-                }
+                return AgentResult.error("No query provided")
             
-            self.log(f"Starting orchestration for query: {user_query}")
+            self.log("Starting orchestration for query: {query}", query=user_query)
             
             # Start action tracking
             self.action_tracker.start()
             
-            # Step 1: Initialize browser (with retry)
-            max_retries = 3
-            browser_initialized = False
-            for attempt in range(max_retries):
-                try:
-                    success = await self.web_navigator.initialize_browser(headless=Config.BROWSER_HEADLESS)
-                    if success:
-                        browser_initialized = True
-                        break
-                    if attempt < max_retries - 1:
-                        await asyncio.sleep(2)
-                        self.log(f"Retrying browser initialization (attempt {attempt + 2}/{max_retries})")
-                except Exception as e:
-                    self.log(f"Browser initialization attempt {attempt + 1} failed: {str(e)}", "warning")
-                    if attempt < max_retries - 1:
-                        await asyncio.sleep(2)
+            # Step 1 & 2: Initialize browser (with retry) and plan the task
+            # concurrently - browser startup and the planning call are independent
+            self.log("Initializing browser and creating task plan...")
+            browser_initialized, plan = await asyncio.gather(
+                self._init_browser_with_retry(),
+                self.plan_task(user_query)
+            )
             
             if not browser_initialized:
-                return {
-                    "status": "error",
-                    "data": {},
-                    "message": "Failed to initialize browser after multiple attempts. Please ensure Playwright is properly installed."
-                }
-            
-            # Step 2: Plan the task
-            self.log("Creating task plan...")
-            plan = await self.plan_task(user_query)
+                # The plan has no side effects, so it is simply discarded
+                return AgentResult.error("Failed to initialize browser after multiple attempts. Please ensure Playwright is properly installed.")
             
             # Step 3: Execute the plan
             self.log("Executing task plan...")
             result = await self.execute_plan(plan, user_query)
             
+            # Output files share a timestamp that is unique per concurrent run
+            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S_%f")
+            
             # Step 4: Take final screenshot and get video
-            await self.web_navigator.take_screenshot("final_state.png")
+            await self.web_navigator.take_screenshot(f"final_state_{timestamp}.jpg")
             
             # Get video path if available
             video_path = await self.web_navigator.get_video_path()
             if video_path:
-                self.log(f"Video recording saved to: {video_path}")
+                self.log("Video recording saved to: {video_path}", video_path=video_path)
             
             # Step 5: Stop tracking and generate test script
             self.action_tracker.stop()
@@ -237,34 +294,27 @@ class OrchestratorAgent(BaseAgent):
             script_generator = PlaywrightScriptGenerator(self.action_tracker.get_actions(), user_query)
             
             # Generate script filename with timestamp
-            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
             script_filename = f"test_generated_{timestamp}.py"
             script_path = script_generator.save(script_filename)
-            self.log(f"Test script generated and saved to: {script_path}")
+            self.log("Test script generated and saved to: {script_path}", script_path=script_path)
             
-            return {
-                "status": result["status"],
-                "data": {
-                    "query": user_query,
-                    "plan": plan,
-                    "execution": result,
-                    "test_script": script_path
-                },
-                "message": f"Orchestration completed with status: {result['status']}. Test script saved to {script_path}"
-            }
+            return AgentResult(result.status, {
+                "query": user_query,
+                "plan": plan,
+                "execution": result,
+                "test_script": script_path
+            }, f"Orchestration completed with status: {result.status}. Test script saved to {script_path}")
         
         except Exception as e:
-            self.log(f"Error in orchestration: {str(e)}", "error")
-            return {
-                "status": "error",
-                "data": {},
-                "message": str(e)
-            }
+            self.log("Error in orchestration: {error}", "error", error=e)
+            return AgentResult.error(str(e))
         finally:
             # Cleanup
-            await self.web_navigator.close()
+            await self.cleanup()
     
     async def cleanup(self):
         """Cleanup resources."""
-        await self.web_navigator.close()
+        # Only close the navigator if it was ever created
+        if "web_navigator" in self.__dict__:
+            await self.web_navigator.close()
 
@@ -1,14 +1,306 @@
 """
 Product Search Agent - Finds products based on specifications.
 """
-from typing import Dict, Any, Optional, List
+from typing import Dict, Any, Optional, List, Tuple
+from collections import OrderedDict
+from urllib.parse import urljoin, urlparse
 from agents.base_agent import BaseAgent
 from agents.web_navigator import WebNavigatorAgent
-from config import Config
-from bs4 import BeautifulSoup
+from config import CONFIG
+from openai import APIStatusError, RateLimitError
+import lxml.html
+from lxml import etree
 import re
 import asyncio
+import copy
 import json
+import os
+import time
+
+# Patterns for the fallback query parser, compiled once at import
+_IPHONE_RE = re.compile(r'iphone\s+(\d+)', re.I)
+_GALAXY_RE = re.compile(r'(samsung\s+galaxy\s+s\d+)', re.I)
+
+_COLORS = ("white", "black", "blue", "red", "green", "yellow", "purple", "pink", "gray", "silver", "gold")
+_BRAND_WEBSITES = {
+    "apple": "https://www.apple.com",
+    "samsung": "https://www.samsung.com",
+    "google": "https://store.google.com",
+    "sony": "https://www.sony.com",
+    "lg": "https://www.lg.com",
+    "nike": "https://www.nike.com",
+    "adidas": "https://www.adidas.com"
+}
+# Product tokens match as word prefixes ("mac" also covers "macbook")
+_PRODUCT_TOKENS = ("iphone", "ipad", "mac", "galaxy")
+_PRODUCT_WEBSITES = {
+    "iphone": "https://www.apple.com",
+    "ipad": "https://www.apple.com",
+    "mac": "https://www.apple.com"
+}
+
+# Keyword -> kinds it counts as; scanned with a single alternation regex so
+# every color, brand and product hit is found in one pass over the text
+_KEYWORD_KINDS: Dict[str, Tuple[str, ...]] = {}
+for _word in _COLORS:
+    _KEYWORD_KINDS[_word] = ("color",)
+for _word in _BRAND_WEBSITES:
+    _KEYWORD_KINDS[_word] = ("brand",)
+_KEYWORD_KINDS["samsung"] = ("brand", "product")
+for _word in _PRODUCT_TOKENS:
+    _KEYWORD_KINDS[_word] = ("product",)
+_KEYWORD_RE = re.compile(
+    r'\b(?:(?:%s)\b|%s)' % (
+        "|".join(_COLORS + tuple(_BRAND_WEBSITES)),
+        "|".join(_PRODUCT_TOKENS)
+    ),
+    re.I
+)
+
+
+# Normalized query -> specs extracted by the LLM, least recently used first.
+# Module-level so every agent (one per orchestrator run) shares the hits.
+_SPEC_CACHE_MAX_SIZE = 256
+_spec_cache: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+
+# Anchors whose href or text mentions a product-ish keyword, filtered entirely
+# inside lxml instead of looping over every link in Python. XPath expressions
+# are compiled once at import rather than re-parsed for every page.
+_PRODUCT_LINK_KEYWORDS = ("product", "item", "buy", "shop", "detail")
+_LOWERCASE_XPATH = "translate({}, 'ABCDEFGHIJKLMNOPQRSTUVWXYZ', 'abcdefghijklmnopqrstuvwxyz')"
+_PRODUCT_LINK_XPATH = etree.XPath("//a[@href][%s]" % " or ".join(
+    f"contains({_LOWERCASE_XPATH.format(source)}, '{keyword}')"
+    for keyword in _PRODUCT_LINK_KEYWORDS
+    for source in ("@href", ".")
+))
+_SEARCH_INPUT_XPATH = etree.XPath("//input[@type='text' or @type='search']")
+
+# Known working search controls for large retailers, keyed by registered domain
+_KNOWN_SEARCH_SELECTORS: Dict[str, Dict[str, str]] = {
+    "amazon.com": {"input": "#twotabsearchtextbox", "button": "#nav-search-submit-button"},
+    "bestbuy.com": {"input": "#gh-search-input", "button": "button.header-search-button"},
+    "walmart.com": {"input": "input[type='search'][name='q']", "button": "button[type='submit'][aria-label*='Search' i]"},
+    "target.com": {"input": "#search", "button": "button[data-test='@web/Search/SearchButton']"},
+    "ebay.com": {"input": "#gh-ac", "button": "#gh-btn"},
+}
+
+# Substrings marking an input as a search box; "q" only counts as an exact
+# name since it would match any attribute containing the letter
+_SEARCH_ATTR_KEYWORDS = {"search", "query"}
+# Every token the fallback query parser looks for, fused into one pattern so
+# the query is scanned exactly once. The iPhone number is captured inside a
+# lookahead so "iphone 15 pro" still yields the "15 pro" model match.
+_QUERY_TOKEN_RE = re.compile(
+    r'(?P<storage>\d+\s*(?:gb|tb))'
+    r'|(?P<model>\d+\s*(?:pro|max|plus|mini))'
+    r'|(?P<galaxy>samsung\s+galaxy\s+s\d+)'
+    r'|(?P<iphone>iphone)(?:(?=\s+(?P<iphone_num>\d+)))?'
+    r'|\b(?:(?P<color>%s)|(?P<brand>%s))\b'
+    r'|\b(?P<product>%s)' % (
+        "|".join(_COLORS),
+        "|".join(_BRAND_WEBSITES),
+        "|".join(token for token in _PRODUCT_TOKENS if token != "iphone")
+    ),
+    re.I
+)
+
+
+def _load_ai_domains() -> Dict[str, float]:
+    """Load the unexpired domains that need AI search box detection.
+    
+    Returns:
+        Dict mapping each domain to the time (epoch seconds) it was recorded
+    """
+    try:
+        with open(CONFIG.SEARCH_AI_DOMAINS_FILE) as f:
+            domains = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    if not isinstance(domains, dict):
+        return {}
+    cutoff = time.time() - CONFIG.SEARCH_AI_DOMAINS_TTL
+    return {domain: recorded for domain, recorded in domains.items() if recorded >= cutoff}
+
+
+def _save_ai_domains(domains: Dict[str, float]):
+    """Persist the domains that need AI search box detection."""
+    try:
+        os.makedirs(os.path.dirname(CONFIG.SEARCH_AI_DOMAINS_FILE) or ".", exist_ok=True)
+        with open(CONFIG.SEARCH_AI_DOMAINS_FILE, 'w') as f:
+            json.dump(domains, f, indent=2, sort_keys=True)
+    except OSError:
+        pass
+
+
+def _scan_keywords(text: str) -> Dict[str, List[str]]:
+    """Find color, brand and product keywords in text in a single pass.
+    
+    Returns:
+        Dict mapping each kind to its keywords in order of appearance
+    """
+    hits: Dict[str, List[str]] = {}
+    for match in _KEYWORD_RE.finditer(text):
+        word = match.group().lower()
+        for kind in _KEYWORD_KINDS[word]:
+            hits.setdefault(kind, []).append(word)
+    return hits
+
+# HTML trimming for LLM prompts: drop markup the model cannot use before
+# truncating, so the character budget goes to actual page structure
+_NON_CONTENT_RE = re.compile(r'<(script|style|noscript)\b[^>]*>.*?</\1>|<!--.*?-->', re.S | re.I)
+_DATA_URI_RE = re.compile(r'data:[^"\')\s]+')
+_WHITESPACE_RE = re.compile(r'\s+')
+# Regions most likely to hold a site's search box
+_SEARCH_FOCUS_RE = re.compile(r'<(form|header|nav|button)\b[^>]*>.*?</\1>|<input\b[^>]*>', re.S | re.I)
+
+
+def _condense_html(html: str, limit: int = 8000, focus_re: Optional[re.Pattern] = None) -> str:
+    """Strip scripts, styles, comments, data URIs and extra whitespace from
+    html, move focus_re matches (if given) to the front, and truncate to limit."""
+    condensed = _NON_CONTENT_RE.sub('', html)
+    condensed = _DATA_URI_RE.sub('data:', condensed)
+    condensed = _WHITESPACE_RE.sub(' ', condensed)
+    if focus_re is not None:
+        focused = "".join(match.group(0) for match in focus_re.finditer(condensed))
+        condensed = focused + focus_re.sub('', condensed)
+    return condensed[:limit]
+
+
+async def _first_truthy(tasks: List["asyncio.Task"]) -> Any:
+    """Return the first truthy result among tasks as they complete, cancelling
+    the rest. Tasks that raise count as misses."""
+    pending = set(tasks)
+    try:
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None and task.result():
+                    return task.result()
+        return None
+    finally:
+        for task in tasks:
+            if task.done():
+                if not task.cancelled():
+                    task.exception()  # Mark failures as retrieved
+            else:
+                task.cancel()
+
+
+# Returns the first selector (in priority order) that the element matches
+_MATCHING_SELECTOR_JS = """(el, selectors) => selectors.find(selector => {
+    try { return el.matches(selector); } catch (e) { return false; }
+}) || null"""
+
+
+async def _first_visible(page, selectors: List[str], timeout: int) -> Optional[Tuple[str, Any]]:
+    """Wait for any of selectors to match a visible element, using a single
+    combined locator, and return (matching selector, element) or None."""
+    locator = page.locator(f"{selectors[0]} >> visible=true")
+    for selector in selectors[1:]:
+        locator = locator.or_(page.locator(f"{selector} >> visible=true"))
+    try:
+        await locator.first.wait_for(state="visible", timeout=timeout)
+        element = await locator.first.element_handle()
+        matched = await element.evaluate(_MATCHING_SELECTOR_JS, selectors)
+    except Exception:
+        return None
+    return (matched or ", ".join(selectors)), element
+
+
+async def _first_present(page, selectors: List[str]) -> Optional[str]:
+    """Query all selectors concurrently and return the first one, in priority
+    order, that matches an element."""
+    results = await asyncio.gather(
+        *(page.query_selector(selector) for selector in selectors),
+        return_exceptions=True
+    )
+    for selector, element in zip(selectors, results):
+        if element and not isinstance(element, Exception):
+            return selector
+    return None
+
+
+# Ranks the elements whose text contains the product name by whole-word
+# keyword match, then text length (containers of the product title match too,
+# so the shortest text is the most specific match). Going down the top 20, it
+# tags the first visible image beside a match - or the match itself if it is a
+# link without an image - with data-ps-target, all within one evaluate call.
+# Candidates come from a native CSS query plus a JS substring test rather than
+# a translate()-based XPath.
+# Image search order: self, descendants, then up to 5 ancestor levels (each
+# with its own siblings), stopping at the first hit.
+_FIND_PRODUCT_TARGET_FN = """([name, keywords]) => {
+    document.querySelectorAll('[data-ps-target]').forEach(el => el.removeAttribute('data-ps-target'));
+    const isVisible = (el) => {
+        const rect = el.getBoundingClientRect();
+        return rect.width > 0 && rect.height > 0 && getComputedStyle(el).visibility !== 'hidden';
+    };
+    const imageNear = (el) => {
+        if (el.tagName === 'IMG') return el;
+        let image = el.querySelector('img');
+        // Each level's querySelector also covers the siblings below it
+        for (let current = el, i = 0; !image && i < 5 && current.parentElement; i++) {
+            current = current.parentElement;
+            image = current.querySelector('img')
+                || current.previousElementSibling?.querySelector('img')
+                || current.nextElementSibling?.querySelector('img');
+        }
+        return image;
+    };
+    const candidates = [];
+    for (const el of document.querySelectorAll('a, h1, h2, h3, h4, span, div, li, article, section')) {
+        const text = el.textContent || '';
+        const textLower = text.toLowerCase();
+        if (!textLower.includes(name)) continue;
+        // Whole-word matches ("iphone 15" but not "iphone 150") rank first
+        const tokens = new Set(textLower.split(/\s+/));
+        candidates.push({el, text, partial: keywords.every(keyword => tokens.has(keyword)) ? 0 : 1});
+    }
+    // Stable sort, so equal ranks keep document order
+    candidates.sort((a, b) => a.partial - b.partial || a.text.length - b.text.length);
+    for (const {el, text} of candidates.slice(0, 20)) {
+        const image = imageNear(el);
+        const target = image || (el.tagName === 'A' ? el : null);
+        // Hidden targets are skipped here rather than timing out on click
+        if (!target || !isVisible(target)) continue;
+        target.setAttribute('data-ps-target', '1');
+        return {
+            text: text.slice(0, 80),
+            kind: image ? 'image' : 'link',
+            href: el.getAttribute('href'),
+            alt: image ? image.getAttribute('alt') || '' : '',
+            src: image ? image.getAttribute('src') || '' : ''
+        };
+    }
+    return null;
+}"""
+
+# Installed on the page once (and on every later document via an init script)
+# so each search only sends a short call expression
+_INSTALL_FIND_PRODUCT_JS = "window.__psFindProduct = %s;" % _FIND_PRODUCT_TARGET_FN
+_FIND_PRODUCT_TARGET_JS = "args => window.__psFindProduct(args)"
+
+
+# alt/title/src and visibility of the first 30 images, fetched in one call.
+# Each image is tagged with data-ps-image="<index>" so the click targets the
+# scanned element itself (a locator's "img" index would also count images in
+# shadow roots, which document.images does not).
+_IMAGE_ATTRIBUTES_JS = """() => {
+    document.querySelectorAll('[data-ps-image]').forEach(el => el.removeAttribute('data-ps-image'));
+    const isVisible = (img) => {
+        const rect = img.getBoundingClientRect();
+        return rect.width > 0 && rect.height > 0 && getComputedStyle(img).visibility !== 'hidden';
+    };
+    const images = Array.from(document.images);
+    return [images.length, images.slice(0, 30).map((img, index) => (img.setAttribute('data-ps-image', index), {
+        index,
+        alt: img.getAttribute('alt') || '',
+        title: img.getAttribute('title') || '',
+        src: img.getAttribute('src') || '',
+        visible: isVisible(img)
+    }))];
+}"""
+
 
 class ProductSearchAgent(BaseAgent):
     """Agent responsible for searching and finding products on websites."""
@@ -16,9 +308,26 @@ class ProductSearchAgent(BaseAgent):
     def __init__(self, openai_client, web_navigator: WebNavigatorAgent):
         super().__init__("ProductSearch", openai_client)
         self.web_navigator = web_navigator
+        # Domains where selector and HTML heuristics failed to find the search box
+        self._domain_ai_needed: Dict[str, float] = _load_ai_domains()
+        # (page URL, product name) -> DOM scan results for click_product_image,
+        # cleared whenever the page's main frame navigates
+        self._dom_cache: Dict[Tuple[str, str], Dict[str, Any]] = {}
+        self._dom_cache_page = None
+    
+    def _on_frame_navigated(self, frame):
+        if frame == frame.page.main_frame:
+            self._dom_cache.clear()
     
     async def extract_product_specs(self, user_query: str) -> Dict[str, Any]:
         """Extract product specifications from user query using OpenAI."""
+        cache_key = " ".join((user_query or "").lower().split())
+        cached = _spec_cache.get(cache_key)
+        if cached is not None:
+            _spec_cache.move_to_end(cache_key)
+            self.log("Using cached product specs")
+            return copy.deepcopy(cached)
+        
         try:
             prompt = f"""
             Extract product specifications from the following user query. Return a JSON object with:
@@ -32,8 +341,8 @@ class ProductSearchAgent(BaseAgent):
             Return only valid JSON, no additional text.
             """
             
-            response = await self.openai_client.chat.completions.create(
-                model=Config.OPENAI_MODEL,
+            response = await self.cached_completion(
+                model=CONFIG.OPENAI_MODEL,
                 messages=[
                     {"role": "system", "content": "You are a helpful assistant that extracts product information from user queries. Always return valid JSON."},
                     {"role": "user", "content": prompt}
@@ -44,14 +353,20 @@ class ProductSearchAgent(BaseAgent):
             
             result = json.loads(response.choices[0].message.content)
             self.log(f"Extracted product specs: {result}")
+            # Only LLM results are cached so a fallback parse never shadows them
+            _spec_cache[cache_key] = copy.deepcopy(result)
+            if len(_spec_cache) > _SPEC_CACHE_MAX_SIZE:
+                _spec_cache.popitem(last=False)
             return result
         
+        except RateLimitError:
+            self.log("API quota exceeded, using fallback parser", "warning")
+            return self._simple_parse_query(user_query)
+        except APIStatusError as e:
+            self.log(f"OpenAI API error {e.status_code} extracting product specs, using fallback parser", "warning")
+            return self._simple_parse_query(user_query)
         except Exception as e:
-            error_msg = str(e)
-            if "429" in error_msg or "quota" in error_msg.lower():
-                self.log("API quota exceeded, using fallback parser", "warning")
-            else:
-                self.log(f"Error extracting product specs: {error_msg}, using fallback parser", "warning")
+            self.log(f"Error extracting product specs: {str(e)}, using fallback parser", "warning")
             return self._simple_parse_query(user_query)
     
     def _simple_parse_query(self, query: str) -> Dict[str, Any]:
@@ -59,24 +374,38 @@ class ProductSearchAgent(BaseAgent):
         specs = {}
         if not query:
             query = ""
-        query_lower = query.lower()
+        storage = model = color = brand = galaxy = iphone_num = None
+        has_iphone = has_samsung = False
+        for match in _QUERY_TOKEN_RE.finditer(query):
+            if match.group("iphone"):
+                has_iphone = True
+                iphone_num = iphone_num or match.group("iphone_num")
+                continue
+            kind = match.lastgroup
+            token = match.group(kind)
+            if kind == "storage":
+                storage = storage or token.upper()
+            elif kind == "model":
+                model = model or token.lower()
+            elif kind == "color":
+                color = color or token.lower()
+            elif kind == "brand":
+                brand = brand or token.lower()
+                has_samsung = has_samsung or token.lower() == "samsung"
+            elif kind == "galaxy":
+                # "Samsung Galaxy S24" also names the brand
+                galaxy = galaxy or token
+                brand = brand or "samsung"
+                has_samsung = True
+            elif kind == "product" and token.lower() == "galaxy":
+                has_samsung = True
         
-        # Extract storage
-        storage_match = re.search(r'(\d+)\s*(gb|tb)', query_lower)
-        if storage_match:
-            specs["storage"] = storage_match.group(0).upper()
-        
-        # Extract color
-        colors = ["white", "black", "blue", "red", "green", "yellow", "purple", "pink", "gray", "silver", "gold"]
-        for color in colors:
-            if color in query_lower:
-                specs["color"] = color
-                break
-        
-        # Extract model numbers
-        model_match = re.search(r'(\d+)\s*(pro|max|plus|mini)', query_lower)
-        if model_match:
-            specs["model"] = model_match.group(0)
+        if storage:
+            specs["storage"] = storage
+        if color:
+            specs["color"] = color
+        if model:
+            specs["model"] = model
         
         # Extract core product name (just the main product, not specs)
         # For iPhone: "iPhone 15 Pro 256GB white" -> "iPhone 15"
@@ -84,18 +413,16 @@ class ProductSearchAgent(BaseAgent):
         product_name = query
         
         # For iPhone, extract just "iPhone" + number
-        if "iphone" in query_lower:
-            iphone_match = re.search(r'iphone\s+(\d+)', query_lower)
-            if iphone_match:
-                search_query = f"iPhone {iphone_match.group(1)}"
-                product_name = f"iPhone {iphone_match.group(1)} Pro"  # Keep Pro in product_name for matching
+        if has_iphone:
+            if iphone_num:
+                search_query = f"iPhone {iphone_num}"
+                product_name = f"iPhone {iphone_num} Pro"  # Keep Pro in product_name for matching
             else:
                 search_query = "iPhone"
         # For Samsung Galaxy
-        elif "galaxy" in query_lower or "samsung" in query_lower:
-            galaxy_match = re.search(r'(samsung\s+galaxy\s+s\d+)', query_lower)
-            if galaxy_match:
-                search_query = galaxy_match.group(1).title()
+        elif has_samsung:
+            if galaxy:
+                search_query = galaxy.title()
                 product_name = query  # Keep full name
             else:
                 words = query.split()
@@ -105,13 +432,8 @@ class ProductSearchAgent(BaseAgent):
             words = query.split()
             search_query = " ".join(words[:3]) if len(words) >= 3 else query
         
-        # Extract brand
-        brands = ["apple", "samsung", "google", "sony", "lg", "nike", "adidas"]
-        brand = None
-        for brand_name in brands:
-            if brand_name in query_lower:
-                brand = brand_name.capitalize()
-                break
+        if brand:
+            brand = brand.capitalize()
         
         return {
             "product_name": product_name,
@@ -123,32 +445,18 @@ class ProductSearchAgent(BaseAgent):
     
     async def determine_website(self, product_specs: Dict[str, Any]) -> str:
         """Determine the website URL based on product specifications."""
-        brand = (product_specs.get("brand") or "").lower()
-        product_name = (product_specs.get("product_name") or "").lower()
-        
-        # Map brands to their websites
-        website_map = {
-            "apple": "https://www.apple.com",
-            "samsung": "https://www.samsung.com",
-            "google": "https://store.google.com",
-            "sony": "https://www.sony.com",
-            "lg": "https://www.lg.com",
-            "nike": "https://www.nike.com",
-            "adidas": "https://www.adidas.com"
-        }
-        
         # Check if website is already specified
         if product_specs.get("website"):
             return product_specs["website"]
         
-        # Check brand mapping
-        for brand_key, website in website_map.items():
-            if brand_key in brand or brand_key in product_name:
-                return website
-        
-        # Default: try to infer from product name
-        if "iphone" in product_name or "ipad" in product_name or "mac" in product_name or "apple" in product_name:
-            return "https://www.apple.com"
+        # Brand hits take priority (the brand field is scanned first), then
+        # infer the site from known product names
+        hits = _scan_keywords(f"{product_specs.get('brand') or ''} {product_specs.get('product_name') or ''}")
+        if "brand" in hits:
+            return _BRAND_WEBSITES[hits["brand"][0]]
+        for product in hits.get("product", ()):
+            if product in _PRODUCT_WEBSITES:
+                return _PRODUCT_WEBSITES[product]
         
         return None
     
@@ -157,6 +465,21 @@ class ProductSearchAgent(BaseAgent):
         try:
             current_url = page.url
             
+            # Known retailers: check their documented search box directly
+            host = urlparse(current_url).netloc.lower().removeprefix("www.")
+            for known_domain, known in _KNOWN_SEARCH_SELECTORS.items():
+                if host == known_domain or host.endswith("." + known_domain):
+                    if await _first_visible(page, [known["input"]], timeout=3000):
+                        self.log(f"Using known search box for {known_domain}: {known['input']}")
+                        return {
+                            "found": True,
+                            "input_selector": known["input"],
+                            "button_selector": known["button"],
+                            "method": "known_domain"
+                        }
+                    self.log(f"Known search box for {known_domain} not visible, probing page", "warning")
+                    break
+            
             # Special handling for Apple.com - need to click search icon first
             if "apple.com" in current_url.lower():
                 self.log("Detected Apple.com - opening search menu first...")
@@ -169,20 +492,16 @@ class ProductSearchAgent(BaseAgent):
                     "#globalnav-menustate-search"
                 ]
                 
-                for icon_selector in apple_search_icons:
+                icon_match = await _first_visible(page, apple_search_icons, timeout=1000)
+                if icon_match:
+                    icon_selector, icon = icon_match
                     try:
-                        icon = await page.query_selector(icon_selector)
-                        if icon:
-                            is_visible = await icon.is_visible()
-                            if is_visible:
-                                await icon.click()
-                                self.log(f"Clicked Apple search icon: {icon_selector}")
-                                await asyncio.sleep(2)  # Wait for search input to appear
-                                break
-                    except:
-                        continue
+                        await icon.click()
+                        self.log(f"Clicked Apple search icon: {icon_selector}")
+                    except Exception:
+                        pass
                 
-                # Now try to find the search input (should be visible after clicking icon)
+                # Now wait for the search input to appear after clicking the icon
                 apple_input_selectors = [
                     "#ac-gn-searchform-input",
                     "input.ac-gn-searchform-input",
@@ -191,171 +510,185 @@ class ProductSearchAgent(BaseAgent):
                     "input[aria-label*='Search' i]"
                 ]
                 
-                for selector in apple_input_selectors:
-                    try:
-                        element = await page.wait_for_selector(selector, timeout=3000, state="visible")
-                        if element:
-                            self.log(f"Found Apple search input: {selector}")
-                            return {
-                                "found": True,
-                                "input_selector": selector,
-                                "button_selector": "button.ac-gn-searchform-submit, button[type='submit']",
-                                "method": "apple_specific"
-                            }
-                    except:
-                        continue
-            
-            # Strategy 1: Try common selectors directly with Playwright
-            common_selectors = [
-                "input[type='search']",
-                "input[type='text'][name*='search' i]",
-                "input[type='text'][id*='search' i]",
-                "input[type='text'][placeholder*='Search' i]",
-                "input[type='text'][placeholder*='search' i]",
-                "input[name='q']",
-                "input[name='search']",
-                "input[id='search']",
-                "input[id='searchbox']",
-                "#search",
-                "#searchbox",
-                ".search input",
-                ".searchbox input",
-                "input[aria-label*='Search' i]",
-                "input[aria-label*='search' i]",
-                "form[action*='search' i] input",
-                "form[method='get'] input[type='text']"
-            ]
-            
-            for selector in common_selectors:
-                try:
-                    element = await page.wait_for_selector(selector, timeout=2000, state="visible")
-                    if element:
-                        # Get more info about the element
-                        tag_name = await element.evaluate("el => el.tagName")
-                        input_type = await element.evaluate("el => el.type || ''")
-                        name_attr = await element.evaluate("el => el.name || ''")
-                        id_attr = await element.evaluate("el => el.id || ''")
-                        
-                        self.log(f"Found search box: {selector} (tag: {tag_name}, type: {input_type}, name: {name_attr}, id: {id_attr})")
-                        
-                        # Find associated button
-                        button_selectors = [
-                            "button[type='submit']",
-                            "input[type='submit']",
-                            "button.search",
-                            "button[aria-label*='Search' i]",
-                            "form button",
-                            f"form:has({selector}) button"
-                        ]
-                        
-                        button_selector = None
-                        for btn_sel in button_selectors:
-                            try:
-                                btn = await page.query_selector(btn_sel)
-                                if btn:
-                                    button_selector = btn_sel
-                                    break
-                            except:
-                                continue
-                        
-                        return {
-                            "found": True,
-                            "input_selector": selector,
-                            "button_selector": button_selector,
-                            "method": "direct_selector"
-                        }
-                except:
-                    continue
+                match = await _first_visible(page, apple_input_selectors, timeout=3000)
+                if match:
+                    selector, _ = match
+                    self.log(f"Found Apple search input: {selector}")
+                    return {
+                        "found": True,
+                        "input_selector": selector,
+                        "button_selector": "button.ac-gn-searchform-submit, button[type='submit']",
+                        "method": "apple_specific"
+                    }
             
-            # Strategy 2: Use AI to analyze page and find search box
+            domain = urlparse(current_url).netloc
+            
+            # Strategy 1 (common selectors) and Strategy 2 (HTML parsing) are
+            # independent and read-only, so race them. Parsing is skipped for
+            # domains where it is known to fail.
+            strategies = [asyncio.create_task(self._find_search_box_direct(page))]
+            if domain not in self._domain_ai_needed:
+                strategies.append(asyncio.create_task(self._find_search_box_parsed()))
+            result = await _first_truthy(strategies)
+            if result:
+                return result
+            if domain and domain not in self._domain_ai_needed:
+                self._domain_ai_needed[domain] = time.time()
+                _save_ai_domains(self._domain_ai_needed)
+            
+            # Strategy 3 (last resort): Use AI to analyze page and find search box
+            page_content = await self.web_navigator.get_page_content()
+            result = await self._find_search_box_ai(page_content)
+            if result:
+                return result
+            
+            return {"found": False}
+        
+        except Exception as e:
+            self.log(f"Error in universal search box detection: {str(e)}", "error")
+            return {"found": False}
+    
+    async def _find_search_box_direct(self, page) -> Optional[Dict[str, Any]]:
+        """Find a visible search input by probing common selectors."""
+        common_selectors = [
+            "input[type='search']",
+            "input[type='text'][name*='search' i]",
+            "input[type='text'][id*='search' i]",
+            "input[type='text'][placeholder*='Search' i]",
+            "input[type='text'][placeholder*='search' i]",
+            "input[name='q']",
+            "input[name='search']",
+            "input[id='search']",
+            "input[id='searchbox']",
+            "#search",
+            "#searchbox",
+            ".search input",
+            ".searchbox input",
+            "input[aria-label*='Search' i]",
+            "input[aria-label*='search' i]",
+            "form[action*='search' i] input",
+            "form[method='get'] input[type='text']"
+        ]
+        
+        match = await _first_visible(page, common_selectors, timeout=2000)
+        if match:
+            selector, element = match
             try:
-                page_content = await self.web_navigator.get_page_content()
-                content_preview = page_content[:8000] if len(page_content) > 8000 else page_content
-                
-                ai_prompt = f"""
-                Analyze this HTML content and find the search input field. Return a JSON object with:
-                - input_selector: Exact CSS selector for the search input field
-                - button_selector: CSS selector for the search/submit button (if exists)
-                - method: "ai_detected"
-                
-                Look for:
-                1. Input fields with type="search" or type="text" that are clearly for searching
-                2. Inputs with name, id, or placeholder containing "search", "q", "query"
-                3. Forms with action containing "search"
-                4. Inputs with aria-label containing "search"
-                
-                HTML Content (first 8000 chars): {content_preview}
+                # Get more info about the element
+                info = await element.evaluate(
+                    "el => ({tag: el.tagName, type: el.type || '', name: el.name || '', id: el.id || ''})"
+                )
+                tag_name = info["tag"]
+                input_type = info["type"]
+                name_attr = info["name"]
+                id_attr = info["id"]
                 
-                Return ONLY valid JSON, no markdown, no code blocks.
-                """
+                self.log(f"Found search box: {selector} (tag: {tag_name}, type: {input_type}, name: {name_attr}, id: {id_attr})")
                 
-                response = await self.openai_client.chat.completions.create(
-                    model=Config.OPENAI_MODEL,
-                    messages=[
-                        {"role": "system", "content": "You are an expert at analyzing HTML and finding search elements. Always return valid JSON only."},
-                        {"role": "user", "content": ai_prompt}
-                    ],
-                    temperature=0.1,
-                    timeout=30.0
-                )
+                # Find associated button
+                button_selectors = [
+                    "button[type='submit']",
+                    "input[type='submit']",
+                    "button.search",
+                    "button[aria-label*='Search' i]",
+                    "form button",
+                    f"form:has({selector}) button"
+                ]
+                button_selector = await _first_present(page, button_selectors)
                 
-                result_text = response.choices[0].message.content.strip()
-                # Remove markdown code blocks if present
-                if result_text.startswith("```"):
-                    result_text = result_text.split("```")[1]
-                    if result_text.startswith("json"):
-                        result_text = result_text[4:]
-                result_text = result_text.strip()
+                return {
+                    "found": True,
+                    "input_selector": selector,
+                    "button_selector": button_selector,
+                    "method": "direct_selector"
+                }
+            except Exception as e:
+                self.log(f"Could not inspect search box {selector}: {str(e)[:100]}", "warning")
+        return None
+    
+    async def _find_search_box_parsed(self) -> Optional[Dict[str, Any]]:
+        """Find a search input by parsing the page HTML off the event loop."""
+        page_content = await self.web_navigator.get_page_content()
+        return await asyncio.to_thread(self._find_search_box_html, page_content)
+    
+    def _find_search_box_html(self, page_content: str) -> Optional[Dict[str, Any]]:
+        """Find a search input by parsing the page HTML."""
+        try:
+            tree = lxml.html.fromstring(page_content)
+            
+            # Find all input elements
+            inputs = _SEARCH_INPUT_XPATH(tree)
+            for inp in inputs:
+                name = (inp.get('name') or '').lower()
+                id_attr = (inp.get('id') or '').lower()
+                placeholder = (inp.get('placeholder') or '').lower()
+                aria_label = (inp.get('aria-label') or '').lower()
                 
-                ai_result = json.loads(result_text)
-                if ai_result.get("input_selector"):
-                    self.log(f"AI found search box: {ai_result.get('input_selector')}")
+                attrs = (name, id_attr, placeholder, aria_label)
+                if name == 'q' or any(keyword in attr for attr in attrs for keyword in _SEARCH_ATTR_KEYWORDS):
+                    selector = f"input"
+                    if inp.get('id'):
+                        selector = f"#{inp.get('id')}"
+                    elif inp.get('name'):
+                        selector = f"input[name='{inp.get('name')}']"
+                    
+                    self.log(f"Found search box via HTML parsing: {selector}")
                     return {
                         "found": True,
-                        "input_selector": ai_result.get("input_selector"),
-                        "button_selector": ai_result.get("button_selector"),
-                        "method": "ai_detected"
+                        "input_selector": selector,
+                        "button_selector": "button[type='submit'], input[type='submit']",
+                        "method": "html_parsing"
                     }
-            except Exception as e:
-                if "429" not in str(e) and "quota" not in str(e).lower():
-                    self.log(f"AI search detection failed: {str(e)[:100]}", "warning")
+        except Exception as e:
+            self.log(f"HTML parsing failed: {str(e)[:100]}", "warning")
+        return None
+    
+    async def _find_search_box_ai(self, page_content: str) -> Optional[Dict[str, Any]]:
+        """Ask the LLM to locate the search input in the page HTML."""
+        try:
+            content_preview = _condense_html(page_content, focus_re=_SEARCH_FOCUS_RE)
             
-            # Strategy 3: Parse HTML with BeautifulSoup
-            try:
-                page_content = await self.web_navigator.get_page_content()
-                soup = BeautifulSoup(page_content, 'html.parser')
-                
-                # Find all input elements
-                inputs = soup.find_all('input', type=['text', 'search'])
-                for inp in inputs:
-                    name = (inp.get('name') or '').lower()
-                    id_attr = (inp.get('id') or '').lower()
-                    placeholder = (inp.get('placeholder') or '').lower()
-                    aria_label = (inp.get('aria-label') or '').lower()
-                    
-                    if any(keyword in text for keyword in ['search', 'q', 'query'] 
-                           for text in [name, id_attr, placeholder, aria_label]):
-                        selector = f"input"
-                        if inp.get('id'):
-                            selector = f"#{inp.get('id')}"
-                        elif inp.get('name'):
-                            selector = f"input[name='{inp.get('name')}']"
-                        
-                        self.log(f"Found search box via HTML parsing: {selector}")
-                        return {
-                            "found": True,
-                            "input_selector": selector,
-                            "button_selector": "button[type='submit'], input[type='submit']",
-                            "method": "html_parsing"
-                        }
-            except Exception as e:
-                self.log(f"HTML parsing failed: {str(e)[:100]}", "warning")
+            ai_prompt = f"""
+            Analyze this HTML content and find the search input field. Return a JSON object with:
+            - input_selector: Exact CSS selector for the search input field
+            - button_selector: CSS selector for the search/submit button (if exists)
+            - method: "ai_detected"
             
-            return {"found": False}
-        
+            Look for:
+            1. Input fields with type="search" or type="text" that are clearly for searching
+            2. Inputs with name, id, or placeholder containing "search", "q", "query"
+            3. Forms with action containing "search"
+            4. Inputs with aria-label containing "search"
+            
+            HTML Content (condensed, search-related regions first): {content_preview}
+            
+            Return ONLY valid JSON, no markdown, no code blocks.
+            """
+            
+            # Stop streaming as soon as the input selector is complete
+            ai_result = await self.stream_json_completion(
+                [
+                    {"role": "system", "content": "You are an expert at analyzing HTML and finding search elements. Always return valid JSON only."},
+                    {"role": "user", "content": ai_prompt}
+                ],
+                required_keys=("input_selector", "button_selector"),
+                model=CONFIG.OPENAI_MODEL,
+                temperature=0.1,
+                timeout=30.0
+            )
+            if ai_result.get("input_selector"):
+                self.log(f"AI found search box: {ai_result.get('input_selector')}")
+                return {
+                    "found": True,
+                    "input_selector": ai_result.get("input_selector"),
+                    "button_selector": ai_result.get("button_selector"),
+                    "method": "ai_detected"
+                }
+        except RateLimitError:
+            pass  # Quota problems are already reported by the spec extraction
         except Exception as e:
-            self.log(f"Error in universal search box detection: {str(e)}", "error")
-            return {"found": False}
+            self.log(f"AI search detection failed: {str(e)[:100]}", "warning")
+        return None
     
     async def execute_search(self, search_query: str, page) -> bool:
         """Execute search using the found search box."""
@@ -375,30 +708,23 @@ class ProductSearchAgent(BaseAgent):
                 ]
                 
                 search_menu_opened = False
-                for icon_selector in apple_search_icons:
+                icon_match = await _first_visible(page, apple_search_icons, timeout=1000)
+                if icon_match:
+                    icon_selector, icon = icon_match
                     try:
-                        icon = await page.query_selector(icon_selector)
-                        if icon:
-                            is_visible = await icon.is_visible()
-                            if is_visible:
-                                self.log(f"Clicking Apple search icon: {icon_selector}")
-                                if self.web_navigator.action_tracker:
-                                    self.web_navigator.action_tracker.add_click(icon_selector, element_type="search_icon")
-                                await icon.click()
-                                await asyncio.sleep(2)  # Wait for search input to appear
-                                if self.web_navigator.action_tracker:
-                                    self.web_navigator.action_tracker.add_sleep(2)
-                                search_menu_opened = True
-                                self.log("Apple search menu opened")
-                                break
+                        self.log(f"Clicking Apple search icon: {icon_selector}")
+                        if self.web_navigator.action_tracker:
+                            self.web_navigator.action_tracker.add_click(icon_selector, element_type="search_icon")
+                        await icon.click()
+                        search_menu_opened = True
+                        self.log("Apple search menu opened")
                     except Exception as e:
                         self.log(f"Could not click icon {icon_selector}: {str(e)[:50]}", "debug")
-                        continue
                 
                 if not search_menu_opened:
                     self.log("Warning: Could not open Apple search menu, trying direct input", "warning")
                 
-                # Step 2: Find and fill search input
+                # Step 2: Wait for the search input to appear, then fill it
                 apple_input_selectors = [
                     '#ac-gn-searchform-input',
                     'input.ac-gn-searchform-input',
@@ -407,62 +733,41 @@ class ProductSearchAgent(BaseAgent):
                     'input[aria-label*="Search" i]'
                 ]
                 
-                search_filled = False
-                for selector in apple_input_selectors:
-                    try:
-                        self.log(f"Trying to find search input: {selector}")
-                        search_input = await page.wait_for_selector(selector, timeout=3000, state='visible')
-                        if search_input:
-                            self.log(f"Found search input: {selector}")
-                            
-                            # Click to focus
-                            if self.web_navigator.action_tracker:
-                                self.web_navigator.action_tracker.add_click(selector, element_type="search_input")
-                            await search_input.click()
-                            await asyncio.sleep(0.5)
-                            if self.web_navigator.action_tracker:
-                                self.web_navigator.action_tracker.add_sleep(0.5)
-                            
-                            # Clear any existing text
-                            await search_input.fill('')
-                            await asyncio.sleep(0.3)
-                            if self.web_navigator.action_tracker:
-                                self.web_navigator.action_tracker.add_sleep(0.3)
-                            
-                            # Type the search query
-                            if self.web_navigator.action_tracker:
-                                self.web_navigator.action_tracker.add_fill(selector, search_query)
-                            await search_input.fill(search_query)
-                            self.log(f"Typed search query: {search_query}")
-                            await asyncio.sleep(1)
-                            if self.web_navigator.action_tracker:
-                                self.web_navigator.action_tracker.add_sleep(1)
-                            
-                            # Submit search
-                            if self.web_navigator.action_tracker:
-                                self.web_navigator.action_tracker.add_press(selector, "Enter")
-                            await search_input.press('Enter')
-                            self.log("Pressed Enter to submit search")
-                            search_filled = True
-                            
-                            # Wait for navigation
-                            await page.wait_for_load_state('networkidle', timeout=10000)
-                            if self.web_navigator.action_tracker:
-                                self.web_navigator.action_tracker.add_wait("load", timeout=10000)
-                            await asyncio.sleep(2)
-                            if self.web_navigator.action_tracker:
-                                self.web_navigator.action_tracker.add_sleep(2)
-                            
-                            new_url = page.url
-                            self.log(f"Search submitted, navigated to: {new_url}")
-                            return True
-                    except Exception as e:
-                        self.log(f"Selector {selector} failed: {str(e)[:50]}", "debug")
-                        continue
-                
-                if not search_filled:
+                match = await _first_visible(page, apple_input_selectors, timeout=4000)
+                if not match:
                     self.log("Could not fill Apple search input", "error")
                     return False
+                
+                selector, search_input = match
+                self.log(f"Found search input: {selector}")
+                try:
+                    # Click to focus (the recorded fill step clicks as well)
+                    await search_input.click()
+                    
+                    # Clear any existing text, then type the search query
+                    await search_input.fill('')
+                    if self.web_navigator.action_tracker:
+                        self.web_navigator.action_tracker.add_fill(selector, search_query)
+                    await search_input.fill(search_query)
+                    await page.wait_for_function("el => el.value.length > 0", arg=search_input, timeout=2000)
+                    self.log(f"Typed search query: {search_query}")
+                    
+                    # Submit search
+                    if self.web_navigator.action_tracker:
+                        self.web_navigator.action_tracker.add_press(selector, "Enter", wait_for_load=10000)
+                    await search_input.press('Enter')
+                    self.web_navigator.invalidate_content_cache()
+                    self.log("Pressed Enter to submit search")
+                    
+                    # Wait for navigation
+                    await page.wait_for_load_state('networkidle', timeout=10000)
+                    
+                    new_url = page.url
+                    self.log(f"Search submitted, navigated to: {new_url}")
+                    return True
+                except Exception as e:
+                    self.log(f"Could not fill Apple search input {selector}: {str(e)[:100]}", "error")
+                    return False
             
             # Generic search flow for other websites
             self.log("Using generic search flow")
@@ -479,21 +784,11 @@ class ProductSearchAgent(BaseAgent):
             
             # Wait for and interact with search input
             try:
-                search_input = await page.wait_for_selector(input_selector, timeout=5000, state="visible")
-                if not search_input:
-                    self.log(f"Search input not visible: {input_selector}", "error")
-                    return False
-                
-                # Click to focus
-                await search_input.click()
-                await asyncio.sleep(0.5)
-                
-                # Clear and fill
-                await search_input.fill('')  # Clear first
-                await asyncio.sleep(0.3)
-                await search_input.fill(search_query)
+                # Locator actions wait for the input to be visible and
+                # editable; fill() focuses it and replaces any existing value
+                search_input = page.locator(input_selector).first
+                await search_input.fill(search_query, timeout=5000)
                 self.log(f"Typed search query: {search_query}")
-                await asyncio.sleep(1)
                 
                 # Submit search
                 submitted = False
@@ -501,11 +796,9 @@ class ProductSearchAgent(BaseAgent):
                 # Try button first
                 if button_selector:
                     try:
-                        button = await page.wait_for_selector(button_selector, timeout=2000)
-                        if button:
-                            await button.click()
-                            self.log(f"Clicked search button: {button_selector}")
-                            submitted = True
+                        await page.locator(button_selector).first.click(timeout=2000)
+                        self.log(f"Clicked search button: {button_selector}")
+                        submitted = True
                     except:
                         pass
                 
@@ -515,10 +808,11 @@ class ProductSearchAgent(BaseAgent):
                     self.log("Pressed Enter to submit search")
                     submitted = True
                 
+                self.web_navigator.invalidate_content_cache()
+                
                 # Wait for results
                 self.log("Waiting for search results...")
                 await page.wait_for_load_state('networkidle', timeout=10000)
-                await asyncio.sleep(3)
                 
                 final_url = page.url
                 self.log(f"Search completed, current URL: {final_url}")
@@ -544,7 +838,7 @@ class ProductSearchAgent(BaseAgent):
             
             # Try AI first if available
             try:
-                content_preview = page_content[:8000] if len(page_content) > 8000 else page_content
+                content_preview = _condense_html(page_content)
                 
                 ai_prompt = f"""
                 Analyze this HTML content and find product elements that match the specifications.
@@ -568,53 +862,42 @@ class ProductSearchAgent(BaseAgent):
                 Return ONLY a valid JSON array, no markdown, no code blocks.
                 """
                 
-                response = await self.openai_client.chat.completions.create(
-                    model=Config.OPENAI_MODEL,
-                    messages=[
+                products = await self.stream_json_completion(
+                    [
                         {"role": "system", "content": "You are an expert at analyzing e-commerce pages and finding products. Always return valid JSON arrays only."},
                         {"role": "user", "content": ai_prompt}
                     ],
+                    model=CONFIG.OPENAI_MODEL,
                     temperature=0.2,
                     timeout=30.0
                 )
-                
-                result_text = response.choices[0].message.content.strip()
-                if result_text.startswith("```"):
-                    result_text = result_text.split("```")[1]
-                    if result_text.startswith("json"):
-                        result_text = result_text[4:]
-                result_text = result_text.strip()
-                
-                products = json.loads(result_text)
                 if isinstance(products, list) and len(products) > 0:
                     self.log(f"AI found {len(products)} products")
                     return products
+            except RateLimitError:
+                pass  # Quota problems are already reported by the spec extraction
             except Exception as e:
-                if "429" not in str(e) and "quota" not in str(e).lower():
-                    self.log(f"AI product finding failed: {str(e)[:100]}", "warning")
+                self.log(f"AI product finding failed: {str(e)[:100]}", "warning")
             
             # Fallback: Parse HTML for product links
-            soup = BeautifulSoup(page_content, 'html.parser')
+            tree = lxml.html.fromstring(page_content)
             products = []
             
             # Look for product links
-            product_keywords = ['product', 'item', 'buy', 'shop', 'detail']
-            for link in soup.find_all('a', href=True):
+            for link in _PRODUCT_LINK_XPATH(tree):
                 href = link.get('href', '')
-                text = link.get_text(strip=True).lower()
-                
-                # Check if it looks like a product link
-                if any(keyword in text or keyword in href.lower() for keyword in product_keywords):
-                    full_url = href if href.startswith('http') else f"{current_url.rstrip('/')}{href}"
-                    products.append({
-                        "title": link.get_text(strip=True),
-                        "link": full_url,
-                        "selector": f"a[href='{href}']",
-                        "matches_specs": True,
-                        "price": None
-                    })
-                    if len(products) >= 5:
-                        break
+                # In-page anchors and script links never lead to a product page
+                if href.startswith('#') or href.startswith('javascript:'):
+                    continue
+                products.append({
+                    "title": " ".join(link.text_content().split()),
+                    "link": urljoin(current_url, href),
+                    "selector": f"a[href='{href}']",
+                    "matches_specs": True,
+                    "price": None
+                })
+                if len(products) >= 5:
+                    break
             
             return products
         
@@ -628,195 +911,104 @@ class ProductSearchAgent(BaseAgent):
         try:
             self.log(f"Reading entire page to find product: {product_name}")
             
-            # Wait for search results to load
-            await page.wait_for_load_state('networkidle', timeout=10000)
-            await asyncio.sleep(2)
+            # Wait for search results to load (networkidle rarely settles on
+            # retail pages with analytics/long-polling, so it only adds timeouts)
+            await page.wait_for_load_state('domcontentloaded', timeout=5000)
             
             # Normalize product name for matching (e.g., "iPhone 17" -> "iphone 17")
             product_name_lower = product_name.lower()
             product_keywords = product_name_lower.split()
             
-            # Get entire page content
-            self.log("Reading entire page content...")
-            page_content = await self.web_navigator.get_page_content()
-            self.log(f"Page content length: {len(page_content)} characters")
-            
-            # Strategy 1: Find all text elements containing the product name
-            self.log("Searching for text elements containing product name...")
+            # Retries on the same page reuse the previous scans
+            if page is not self._dom_cache_page:
+                self._dom_cache.clear()
+                page.on("framenavigated", self._on_frame_navigated)
+                await page.add_init_script(_INSTALL_FIND_PRODUCT_JS)
+                await page.evaluate(f"() => {{ {_INSTALL_FIND_PRODUCT_JS} }}")
+                self._dom_cache_page = page
+            dom_cache = self._dom_cache.setdefault((page.url, product_name_lower), {})
             
-            # XPath to find elements containing the product name
-            xpath_queries = [
-                f"//*[contains(translate(text(), 'ABCDEFGHIJKLMNOPQRSTUVWXYZ', 'abcdefghijklmnopqrstuvwxyz'), '{product_name_lower}')]",
-                f"//*[contains(translate(., 'ABCDEFGHIJKLMNOPQRSTUVWXYZ', 'abcdefghijklmnopqrstuvwxyz'), '{product_name_lower}')]",
-                f"//text()[contains(translate(., 'ABCDEFGHIJKLMNOPQRSTUVWXYZ', 'abcdefghijklmnopqrstuvwxyz'), '{product_name_lower}')]/..",
-            ]
+            # Both scans are read-only, so run the text search and the image
+            # attribute fallback scan together; the text match still wins
+            if "target" not in dom_cache or "images" not in dom_cache:
+                self.log("Searching for text elements and images matching product name...")
+                target_scan, image_scan = await asyncio.gather(
+                    page.evaluate(_FIND_PRODUCT_TARGET_JS, [product_name_lower, product_keywords]),
+                    page.evaluate(_IMAGE_ATTRIBUTES_JS),
+                    return_exceptions=True
+                )
+                if isinstance(target_scan, Exception):
+                    self.log(f"Product text search failed: {str(target_scan)[:100]}", "debug")
+                else:
+                    dom_cache["target"] = target_scan
+                if isinstance(image_scan, Exception):
+                    self.log(f"Image search fallback failed: {str(image_scan)[:100]}", "warning")
+                else:
+                    dom_cache["images"] = image_scan
             
-            for xpath_query in xpath_queries:
-                try:
-                    # Find all elements containing the product name
-                    elements = await page.query_selector_all(f"xpath={xpath_query}")
-                    self.log(f"Found {len(elements)} elements containing product name")
-                    
-                    for element in elements[:20]:  # Check first 20 matches
-                        try:
-                            element_text = await element.text_content()
-                            element_text_lower = (element_text or "").lower()
-                            
-                            # Verify it actually contains all keywords
-                            if all(keyword in element_text_lower for keyword in product_keywords):
-                                self.log(f"Found matching element: {element_text[:80]}...")
-                                
-                                # Get the element's tag name
-                                tag_name = await element.evaluate("el => el.tagName.toLowerCase()")
-                                
-                                # Strategy: Find image in the same container/parent/sibling
-                                image = None
-                                
-                                # 1. Check if element itself is an image
-                                if tag_name == "img":
-                                    image = element
-                                
-                                # 2. Check for image within the same element
-                                if not image:
-                                    image = await element.query_selector("img")
-                                
-                                # 3. Check for image in parent element
-                                if not image:
-                                    try:
-                                        parent = await element.evaluate_handle("el => el.parentElement")
-                                        if parent:
-                                            image = await parent.query_selector("img")
-                                    except:
-                                        pass
-                                
-                                # 4. Check for image in grandparent element
-                                if not image:
-                                    try:
-                                        grandparent = await element.evaluate_handle("el => el.parentElement?.parentElement")
-                                        if grandparent:
-                                            image = await grandparent.query_selector("img")
-                                    except:
-                                        pass
-                                
-                                # 5. Check for sibling images (previous or next sibling)
-                                if not image:
-                                    try:
-                                        # Try previous sibling
-                                        prev_sibling = await element.evaluate_handle("el => el.previousElementSibling")
-                                        if prev_sibling:
-                                            prev_img = await prev_sibling.query_selector("img")
-                                            if prev_img:
-                                                image = prev_img
-                                        
-                                        # Try next sibling
-                                        if not image:
-                                            next_sibling = await element.evaluate_handle("el => el.nextElementSibling")
-                                            if next_sibling:
-                                                next_img = await next_sibling.query_selector("img")
-                                                if next_img:
-                                                    image = next_img
-                                    except:
-                                        pass
-                                
-                                # 6. Check for image in common ancestor (container)
-                                if not image:
-                                    try:
-                                        # Walk up the DOM tree to find a container with an image
-                                        current = element
-                                        for _ in range(5):  # Check up to 5 levels up
-                                            parent = await current.evaluate_handle("el => el.parentElement")
-                                            if not parent:
-                                                break
-                                            
-                                            # Check if parent has an image
-                                            parent_img = await parent.query_selector("img")
-                                            if parent_img:
-                                                image = parent_img
-                                                break
-                                            
-                                            current = parent
-                                    except:
-                                        pass
-                                
-                                # If we found an image, click it
-                                if image:
-                                    try:
-                                        is_visible = await image.is_visible()
-                                        if is_visible:
-                                            self.log("Found product image beside product name, clicking...")
-                                            await image.scroll_into_view_if_needed()
-                                            await asyncio.sleep(0.5)
-                                            if self.web_navigator.action_tracker:
-                                                self.web_navigator.action_tracker.add_click("img (product image)", element_type="product_image")
-                                                self.web_navigator.action_tracker.add_sleep(0.5)
-                                            await image.click()
-                                            await asyncio.sleep(2)
-                                            if self.web_navigator.action_tracker:
-                                                self.web_navigator.action_tracker.add_sleep(2)
-                                            await page.wait_for_load_state('networkidle', timeout=10000)
-                                            if self.web_navigator.action_tracker:
-                                                self.web_navigator.action_tracker.add_wait("load", timeout=10000)
-                                            self.log(f"Successfully clicked product image, navigated to: {page.url}")
-                                            return True
-                                    except Exception as e:
-                                        self.log(f"Error clicking image: {str(e)[:100]}", "warning")
-                                        continue
-                                
-                                # If no image found but element is clickable (link), click it
-                                if not image and tag_name == "a":
-                                    try:
-                                        is_visible = await element.is_visible()
-                                        if is_visible:
-                                            href = await element.get_attribute("href")
-                                            self.log(f"Clicking product link directly: {href}")
-                                            await element.scroll_into_view_if_needed()
-                                            await asyncio.sleep(0.5)
-                                            await element.click()
-                                            await asyncio.sleep(2)
-                                            await page.wait_for_load_state('networkidle', timeout=10000)
-                                            self.log(f"Successfully clicked product link, navigated to: {page.url}")
-                                            return True
-                                    except Exception as e:
-                                        continue
-                                
-                        except Exception as e:
-                            continue
-                            
-                except Exception as e:
-                    self.log(f"XPath query failed: {str(e)[:100]}", "debug")
-                    continue
+            # Strategy 1: Click the image beside text containing the product name
+            try:
+                # The text match and the image beside it were located in the
+                # browser; click the tagged element through a locator, which
+                # scrolls it into view and waits for it to be actionable. A
+                # hidden element times out quickly and falls through instead
+                # of being probed with is_visible() first
+                found = dom_cache.get("target")
+                target = page.locator('[data-ps-target="1"]')
+                
+                if found and found["kind"] == "image":
+                    self.log(f"Found matching element: {found['text']}...")
+                    try:
+                        self.log(f"Found product image beside product name ({found['alt'][:50] or found['src'][:50]}), clicking...")
+                        if self.web_navigator.action_tracker:
+                            self.web_navigator.action_tracker.add_click("img (product image)", element_type="product_image", wait_for_load=5000)
+                        # The click only starts the navigation; wait for the URL to change
+                        prev_url = page.url
+                        await target.click(timeout=2000)
+                        await page.wait_for_url(lambda url: url != prev_url, wait_until="domcontentloaded", timeout=5000)
+                        self.log(f"Successfully clicked product image, navigated to: {page.url}")
+                        return True
+                    except Exception as e:
+                        self.log(f"Error clicking image: {str(e)[:100]}", "warning")
+                
+                # If no image found but element is clickable (link), click it
+                elif found and found["kind"] == "link":
+                    self.log(f"Found matching element: {found['text']}...")
+                    try:
+                        self.log(f"Clicking product link directly: {found['href']}")
+                        prev_url = page.url
+                        await target.click(timeout=2000)
+                        await page.wait_for_url(lambda url: url != prev_url, wait_until="domcontentloaded", timeout=5000)
+                        self.log(f"Successfully clicked product link, navigated to: {page.url}")
+                        return True
+                    except Exception:
+                        pass
+                        
+            except Exception as e:
+                self.log(f"Product text click failed: {str(e)[:100]}", "debug")
             
             # Fallback: Find images with alt text or src containing product name
             self.log("Trying fallback: searching images by alt/src attributes...")
             try:
-                all_images = await page.query_selector_all("img")
-                self.log(f"Found {len(all_images)} images on page")
+                total_images, images = dom_cache.get("images", (0, []))
+                self.log(f"Found {total_images} images on page")
                 
-                for img in all_images[:30]:  # Check first 30 images
-                    try:
-                        alt_text = await img.get_attribute("alt") or ""
-                        title_text = await img.get_attribute("title") or ""
-                        src = await img.get_attribute("src") or ""
-                        
-                        alt_lower = alt_text.lower()
-                        title_lower = title_text.lower()
-                        src_lower = src.lower()
-                        
-                        # Check if any attribute contains product keywords
-                        if any(keyword in alt_lower or keyword in title_lower or keyword in src_lower 
-                               for keyword in product_keywords):
-                            is_visible = await img.is_visible()
-                            if is_visible:
-                                self.log(f"Found product image via attributes: {alt_text[:50]}")
-                                await img.scroll_into_view_if_needed()
-                                await asyncio.sleep(0.5)
-                                await img.click()
-                                await asyncio.sleep(2)
-                                await page.wait_for_load_state('networkidle', timeout=10000)
-                                self.log(f"Successfully clicked product image, navigated to: {page.url}")
-                                return True
-                    except:
-                        continue
+                # One alternation scan per image instead of a substring test per keyword
+                keyword_re = re.compile("|".join(map(re.escape, product_keywords)))
+                
+                for image in images:
+                    # Check if any attribute contains product keywords
+                    haystack = f"{image['alt']} {image['title']} {image['src']}".lower()
+                    if image["visible"] and product_keywords and keyword_re.search(haystack):
+                        try:
+                            self.log(f"Found product image via attributes: {image['alt'][:50]}")
+                            prev_url = page.url
+                            await page.locator(f'[data-ps-image="{image["index"]}"]').click(timeout=2000)
+                            await page.wait_for_url(lambda url: url != prev_url, wait_until="domcontentloaded", timeout=5000)
+                            self.log(f"Successfully clicked product image, navigated to: {page.url}")
+                            return True
+                        except:
+                            continue
             except Exception as e:
                 self.log(f"Image search fallback failed: {str(e)[:100]}", "warning")
             
@@ -829,6 +1021,35 @@ class ProductSearchAgent(BaseAgent):
             self.log(traceback.format_exc(), "error")
             return False
     
+    def _derive_search_query(self, product_specs: Dict[str, Any], user_query: str) -> str:
+        """Extract just the product name to search for (not full specs)."""
+        # Use search_query from product_specs if available
+        if product_specs.get("search_query"):
+            return product_specs["search_query"]
+        
+        # Extract simplified product name from full query
+        full_product_name = product_specs.get("product_name", user_query)
+        full_product_name_lower = full_product_name.lower()
+        
+        # For iPhone: "iPhone 15 Pro 256GB white" -> "iPhone 15"
+        if "iphone" in full_product_name_lower:
+            iphone_match = _IPHONE_RE.search(full_product_name_lower)
+            if iphone_match:
+                return f"iPhone {iphone_match.group(1)}"
+            else:
+                return "iPhone"
+        # For Samsung: "Samsung Galaxy S24 Ultra" -> "Samsung Galaxy S24"
+        elif "samsung" in full_product_name_lower or "galaxy" in full_product_name_lower:
+            galaxy_match = _GALAXY_RE.search(full_product_name_lower)
+            if galaxy_match:
+                return galaxy_match.group(1).title()
+            else:
+                return " ".join(full_product_name.split()[:3])
+        else:
+            # For other products, take first 2-3 words (brand + model)
+            words = full_product_name.split()
+            return " ".join(words[:3]) if len(words) >= 3 else full_product_name
+    
     async def execute(self, task: Dict[str, Any], context: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
         """Execute product search task."""
         try:
@@ -838,9 +1059,11 @@ class ProductSearchAgent(BaseAgent):
             self.log("Extracting product specifications...")
             product_specs = await self.extract_product_specs(user_query)
             
-            # Step 2: Determine website
+            # Step 2: Determine website and derive the search query (both are
+            # pure lookups on the specs, so there is nothing to overlap)
             self.log("Determining website...")
             website = await self.determine_website(product_specs)
+            search_query = self._derive_search_query(product_specs, user_query)
             
             if not website:
                 product_name_lower = (product_specs.get("product_name") or "").lower()
@@ -878,33 +1101,6 @@ class ProductSearchAgent(BaseAgent):
                     "message": "Browser page not available"
                 }
             
-            # Extract just the product name for search (not full specs)
-            # Use search_query from product_specs if available
-            search_query = product_specs.get("search_query")
-            
-            if not search_query:
-                # Extract simplified product name from full query
-                full_product_name = product_specs.get("product_name", user_query)
-                
-                # For iPhone: "iPhone 15 Pro 256GB white" -> "iPhone 15"
-                if "iphone" in full_product_name.lower():
-                    iphone_match = re.search(r'iphone\s+(\d+)', full_product_name.lower())
-                    if iphone_match:
-                        search_query = f"iPhone {iphone_match.group(1)}"
-                    else:
-                        search_query = "iPhone"
-                # For Samsung: "Samsung Galaxy S24 Ultra" -> "Samsung Galaxy S24"
-                elif "samsung" in full_product_name.lower() or "galaxy" in full_product_name.lower():
-                    galaxy_match = re.search(r'(samsung\s+galaxy\s+s\d+)', full_product_name.lower())
-                    if galaxy_match:
-                        search_query = galaxy_match.group(1).title()
-                    else:
-                        search_query = " ".join(full_product_name.split()[:3])
-                else:
-                    # For other products, take first 2-3 words (brand + model)
-                    words = full_product_name.split()
-                    search_query = " ".join(words[:3]) if len(words) >= 3 else full_product_name
-            
             self.log(f"Using simplified search query: '{search_query}' (extracted from: '{user_query}')")
             search_success = await self.execute_search(search_query, page)
             
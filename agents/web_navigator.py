@@ -1,257 +1,747 @@
 """
 Web Navigator Agent - Handles browser automation and navigation.
 """
-from typing import Dict, Any, Optional
-from playwright.async_api import async_playwright, Browser, Page, BrowserContext
+from typing import Dict, Any, Optional, Sequence, List, Set, Tuple
+from playwright.async_api import async_playwright, Browser, Page, BrowserContext, Locator
+from playwright.async_api import TimeoutError as PlaywrightTimeoutError
 from agents.base_agent import BaseAgent
+from config import CONFIG
+from loguru import logger
+from urllib.parse import urlparse
 import asyncio
+import os
+import shutil
+
+# Pause after actions (and slow down input) only when a visible browser is
+# being watched; otherwise rely on Playwright's auto-waiting
+_VISUAL_DEBUG = not CONFIG.BROWSER_HEADLESS and bool(os.getenv("VISUAL_DEBUG"))
+_SLOW_MO = 500 if _VISUAL_DEBUG else 0
+
+_VIEWPORT = {'width': 1920, 'height': 1080}
+_USER_AGENT = 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36'
+
+# Stability/throughput flags for every Chromium launch; headless adds
+# --no-sandbox and --no-zygote (the zygote can only be skipped unsandboxed)
+_LAUNCH_ARGS = ['--disable-dev-shm-usage', '--disable-gpu', '--disable-background-timer-throttling']
+_HEADLESS_LAUNCH_ARGS = ['--no-sandbox', '--no-zygote', *_LAUNCH_ARGS]
+
+# Resources never needed to locate DOM elements. Images stay on in a visible
+# browser (and are what product image clicks target there).
+_BLOCKED_RESOURCE_TYPES = frozenset({"image", "media", "font"})
+_BLOCKED_RESOURCE_TYPES_VISIBLE = frozenset({"media", "font"})
+_TRACKER_HOSTS = (
+    "google-analytics.com",
+    "googletagmanager.com",
+    "doubleclick.net",
+    "googlesyndication.com",
+    "facebook.net",
+    "hotjar.com",
+    "scorecardresearch.com",
+)
+
+
+async def _block_assets(context: BrowserContext, headless: bool):
+    """Abort non-essential asset and tracker requests on the context."""
+    blocked_types = _BLOCKED_RESOURCE_TYPES if headless else _BLOCKED_RESOURCE_TYPES_VISIBLE
+    
+    async def handle(route):
+        request = route.request
+        host = urlparse(request.url).hostname or ""
+        if request.resource_type in blocked_types or host.endswith(_TRACKER_HOSTS):
+            await route.abort()
+        else:
+            await route.continue_()
+    
+    await context.route("**/*", handle)
+
+# Finds and clicks the first visible, enabled element matching one of the
+# given CSS selectors entirely inside the page, so only the matched selector
+# crosses the CDP boundary. Selectors that are not valid native CSS are skipped.
+_FIND_AND_CLICK_JS = """(selectors) => {
+    for (const selector of selectors) {
+        let matches = [];
+        try {
+            matches = document.querySelectorAll(selector);
+        } catch (e) {
+            continue;
+        }
+        for (const el of matches) {
+            if (el.disabled || !el.getClientRects().length) continue;
+            if (getComputedStyle(el).visibility === 'hidden') continue;
+            el.click();
+            return selector;
+        }
+    }
+    return null;
+}"""
+
+# Sets the value of each (selector, value) pair and fires input/change events
+# so framework-bound forms pick the change up. Uses the native value setter to
+# bypass React-style property overrides. Returns the selectors it could not fill.
+_FILL_BATCH_JS = """(pairs) => {
+    const missing = [];
+    for (const [selector, value] of pairs) {
+        let el = null;
+        try {
+            el = document.querySelector(selector);
+        } catch (e) {}
+        if (!el || !('value' in el)) {
+            missing.push(selector);
+            continue;
+        }
+        const proto = Object.getPrototypeOf(el);
+        const setter = Object.getOwnPropertyDescriptor(proto, 'value')?.set;
+        if (setter) setter.call(el, value); else el.value = value;
+        el.dispatchEvent(new Event('input', {bubbles: true}));
+        el.dispatchEvent(new Event('change', {bubbles: true}));
+    }
+    return missing;
+}"""
+
+# Serializes matching elements into compact descriptors (only non-empty
+# fields) so callers can prompt an LLM with the page's controls instead of
+# raw HTML full of scripts, styles and tracking markup. Invisible elements are
+# skipped and, before the limit is applied, controls inside main/form rank
+# above the rest and buttons above links, so header and footer navigation
+# cannot crowd out the controls that matter.
+_INTERACTIVE_ELEMENTS_JS = """([selector, limit]) => {
+    const ranked = [];
+    for (const el of document.querySelectorAll(selector)) {
+        if (!el.getClientRects().length || getComputedStyle(el).visibility === 'hidden') continue;
+        const rank = (el.closest('main, form') ? 0 : 2) + (el.tagName === 'A' && el.getAttribute('role') !== 'button' ? 1 : 0);
+        ranked.push([rank, ranked.length, el]);
+    }
+    ranked.sort((a, b) => a[0] - b[0] || a[1] - b[1]);
+    const out = [];
+    for (const [, , el] of ranked.slice(0, limit)) {
+        const item = {tag: el.tagName.toLowerCase()};
+        const text = (el.innerText || '').trim().replace(/\\s+/g, ' ').slice(0, 80);
+        if (text) item.text = text;
+        if (el.id) item.id = el.id;
+        if (el.classList.length) item.classes = Array.from(el.classList).slice(0, 4).join(' ');
+        for (const attr of ['name', 'type', 'placeholder', 'href', 'data-testid', 'aria-label']) {
+            const value = el.getAttribute(attr);
+            if (value) item[attr] = value.slice(0, 120);
+        }
+        out.push(item);
+    }
+    return out;
+}"""
+
+# Maps each autocomplete token (last token of the attribute, e.g. "given-name"
+# in "shipping given-name") to a CSS selector for the first visible control
+# carrying it, and marks the submit control of the form holding the first
+# mapped field with data-ac-submit.
+_AUTOCOMPLETE_INPUTS_JS = """() => {
+    const fields = {};
+    let form = null;
+    for (const el of document.querySelectorAll('input[autocomplete], select[autocomplete], textarea[autocomplete]')) {
+        if (el.type === 'hidden' || el.disabled || !el.getClientRects().length) continue;
+        const tokens = (el.getAttribute('autocomplete') || '').trim().toLowerCase().split(/\\s+/);
+        const token = tokens[tokens.length - 1];
+        if (!token || token === 'off' || token === 'on' || token in fields) continue;
+        const tag = el.tagName.toLowerCase();
+        if (el.id) fields[token] = '#' + CSS.escape(el.id);
+        else if (el.name) fields[token] = tag + '[name="' + CSS.escape(el.name) + '"]';
+        else fields[token] = tag + '[autocomplete="' + CSS.escape(el.getAttribute('autocomplete')) + '"]';
+        form = form || el.closest('form');
+    }
+    document.querySelectorAll('[data-ac-submit]').forEach(el => el.removeAttribute('data-ac-submit'));
+    let submit = null;
+    if (form) {
+        for (const el of form.querySelectorAll('button[type="submit"], input[type="submit"]')) {
+            if (el.disabled || !el.getClientRects().length) continue;
+            el.setAttribute('data-ac-submit', '1');
+            submit = '[data-ac-submit="1"]';
+            break;
+        }
+    }
+    return {fields, submit};
+}"""
+
+class BrowserPool:
+    """Process-wide Playwright driver and Browser shared by all navigators.
+    
+    Launching Chromium costs seconds while a BrowserContext is cheap, so the
+    browser is started once (lazily) and each navigator session only opens a
+    fresh context on it. Call shutdown() once the process is done with it.
+    """
+    
+    _playwright = None
+    _browser: Optional[Browser] = None
+    _chrome_process: Optional[asyncio.subprocess.Process] = None
+    _persistent_context: Optional[BrowserContext] = None
+    _lock = asyncio.Lock()
+    _logger = logger.bind(agent="BrowserPool")
+    
+    @classmethod
+    async def get_browser(cls, headless: bool = False) -> Browser:
+        """Return the shared browser, launching it on first use (or if it died)."""
+        async with cls._lock:
+            if cls._browser and cls._browser.is_connected():
+                return cls._browser
+            await cls._stop()
+            
+            cls._logger.info("Starting Playwright...")
+            cls._playwright = await async_playwright().start()
+            cls._logger.info(f"Launching browser (headless={headless})...")
+            if CONFIG.USE_CDP_DIRECT:
+                cls._browser = await cls._launch_over_cdp(headless)
+            else:
+                cls._browser = await cls._launch(headless)
+            return cls._browser
+    
+    @classmethod
+    async def get_persistent_context(cls, headless: bool = False) -> BrowserContext:
+        """Return the shared context on CONFIG.BROWSER_USER_DATA_DIR, launching
+        it on first use. Its HTTP cache and cookies survive between runs."""
+        async with cls._lock:
+            # Reset by the close handler if the browser goes away
+            if cls._persistent_context:
+                return cls._persistent_context
+            await cls._stop()
+            
+            if CONFIG.CLEAR_USER_DATA:
+                shutil.rmtree(CONFIG.BROWSER_USER_DATA_DIR, ignore_errors=True)
+            cls._logger.info(f"Starting Playwright with profile {CONFIG.BROWSER_USER_DATA_DIR} (headless={headless})...")
+            cls._playwright = await async_playwright().start()
+            cls._persistent_context = await cls._playwright.chromium.launch_persistent_context(
+                user_data_dir=CONFIG.BROWSER_USER_DATA_DIR,
+                headless=headless,
+                slow_mo=_SLOW_MO,
+                viewport=_VIEWPORT,
+                user_agent=_USER_AGENT,
+                args=['--disable-blink-features=AutomationControlled', '--no-first-run',
+                      *(_HEADLESS_LAUNCH_ARGS if headless else _LAUNCH_ARGS)]
+            )
+            cls._persistent_context.on("close", lambda _: setattr(cls, "_persistent_context", None))
+            if CONFIG.BLOCK_ASSETS:
+                await _block_assets(cls._persistent_context, headless)
+            return cls._persistent_context
+    
+    @classmethod
+    async def _launch_over_cdp(cls, headless: bool) -> Browser:
+        """Start Chrome with remote debugging and attach to it over CDP."""
+        executable = CONFIG.CHROME_EXECUTABLE or cls._playwright.chromium.executable_path
+        args = [
+            f"--remote-debugging-port={CONFIG.CDP_PORT}",
+            f"--user-data-dir={CONFIG.CDP_USER_DATA_DIR}",
+            "--no-first-run",
+            "--no-default-browser-check",
+        ]
+        if headless:
+            args.append("--headless=new")
+        cls._chrome_process = await asyncio.create_subprocess_exec(
+            executable, *args,
+            stdout=asyncio.subprocess.DEVNULL,
+            stderr=asyncio.subprocess.DEVNULL
+        )
+        
+        # The debugging endpoint comes up shortly after the process starts
+        endpoint = f"http://localhost:{CONFIG.CDP_PORT}"
+        for attempt in range(20):
+            try:
+                browser = await cls._playwright.chromium.connect_over_cdp(endpoint)
+                cls._logger.info(f"✅ Connected to Chrome over CDP at {endpoint}")
+                return browser
+            except Exception:
+                if cls._chrome_process.returncode is not None or attempt == 19:
+                    raise
+                await asyncio.sleep(0.25)
+    
+    @classmethod
+    async def _launch(cls, headless: bool) -> Browser:
+        """Launch Chromium - system Chrome first in visible mode, then bundled."""
+        if not headless:
+            # Try using system Chrome first (more stable on macOS)
+            try:
+                cls._logger.info("Trying to use system Chrome...")
+                browser = await cls._playwright.chromium.launch(
+                    headless=False,
+                    channel='chrome',  # Use system Chrome if available
+                    slow_mo=_SLOW_MO,
+                    args=_LAUNCH_ARGS
+                )
+                cls._logger.info("✅ Successfully launched system Chrome")
+                return browser
+            except Exception as e:
+                cls._logger.warning(f"System Chrome not available: {e}, trying bundled Chromium")
+        
+        # Use bundled Chromium
+        try:
+            if headless:
+                browser = await cls._playwright.chromium.launch(
+                    headless=True,
+                    args=_HEADLESS_LAUNCH_ARGS
+                )
+            else:
+                browser = await cls._playwright.chromium.launch(
+                    headless=False,
+                    slow_mo=_SLOW_MO,
+                    args=_LAUNCH_ARGS
+                )
+            cls._logger.info("✅ Successfully launched bundled Chromium")
+            return browser
+        except Exception as launch_error:
+            cls._logger.error(f"Bundled Chromium launch failed: {launch_error}")
+            raise
+    
+    @classmethod
+    async def _stop(cls):
+        if cls._persistent_context:
+            try:
+                await cls._persistent_context.close()
+            except:
+                pass
+            cls._persistent_context = None
+        if cls._browser:
+            try:
+                await cls._browser.close()
+            except:
+                pass
+            cls._browser = None
+        if cls._playwright:
+            try:
+                await cls._playwright.stop()
+            except:
+                pass
+            cls._playwright = None
+        if cls._chrome_process:
+            if cls._chrome_process.returncode is None:
+                cls._chrome_process.terminate()
+                await cls._chrome_process.wait()
+            cls._chrome_process = None
+    
+    @classmethod
+    async def shutdown(cls):
+        """Close the shared browser and stop Playwright."""
+        async with cls._lock:
+            await cls._stop()
+
 
 class WebNavigatorAgent(BaseAgent):
     """Agent responsible for web navigation and browser automation."""
     
     def __init__(self, openai_client, action_tracker=None):
         super().__init__("WebNavigator", openai_client)
+        # Shared via BrowserPool; only the context and page belong to this agent
         self.browser: Optional[Browser] = None
         self.context: Optional[BrowserContext] = None
         self.page: Optional[Page] = None
-        self.playwright = None
+        # False when the context is the pool's shared persistent one
+        self._owns_context = True
         self.action_tracker = action_tracker
+        # (url, html) of the last get_page_content() call; dropped whenever the
+        # page navigates or an action may have changed the DOM
+        self._content_cache: Optional[Tuple[str, str]] = None
+        # Selector -> locator already seen visible on the current document;
+        # cleared on navigation like the content cache
+        self._selector_cache: Dict[str, Locator] = {}
+        # Background full-page screenshots still writing
+        self._screenshot_tasks: Set[asyncio.Task] = set()
+    
+    def invalidate_content_cache(self):
+        """Forget cached page content (call after acting on the page directly)."""
+        self._content_cache = None
+    
+    def _on_frame_navigated(self, frame):
+        if self.page and frame == self.page.main_frame:
+            self._content_cache = None
+            self._selector_cache.clear()
     
     async def _cleanup_browser(self):
-        """Clean up browser resources."""
-        try:
-            if self.page:
-                try:
-                    await self.page.close()
-                except:
-                    pass
-                self.page = None
-        except:
-            pass
-        
-        try:
-            if self.context:
-                try:
-                    await self.context.close()
-                except:
-                    pass
-                self.context = None
-        except:
-            pass
+        """Close this agent's page and context."""
+        page, context = self.page, self.context if self._owns_context else None
+        # Detach first so nothing re-enters with half-closed handles
+        self.page = None
+        self.context = None
+        # The shared browser stays up for the next session
+        self.browser = None
         
-        try:
-            if self.browser:
-                try:
-                    await self.browser.close()
-                except:
-                    pass
-                self.browser = None
-        except:
-            pass
-        
-        try:
-            if self.playwright:
-                try:
-                    await self.playwright.stop()
-                except:
-                    pass
-                self.playwright = None
-        except:
-            pass
+        closing = [handle.close() for handle in (page, context) if handle]
+        if not closing:
+            return
+        results = await asyncio.gather(*closing, return_exceptions=True)
+        errors = [result for result in results if isinstance(result, Exception)]
+        if errors:
+            self.log("Ignored {count} error(s) closing page/context: {error}", "debug", count=len(errors), error=str(errors[0])[:100])
     
     async def initialize_browser(self, headless: bool = False):
-        """Initialize the browser instance."""
+        """Open a fresh context and page on the shared browser."""
         try:
             # Clean up any existing instances first
             await self._cleanup_browser()
-            await asyncio.sleep(1)  # Longer wait for cleanup
-            
-            self.log("Starting Playwright...")
-            # Initialize fresh browser instance
-            self.playwright = await async_playwright().start()
-            await asyncio.sleep(1)
-            
-            self.log(f"Launching browser (headless={headless})...")
-            # Launch browser - try multiple approaches
-            browser_launched = False
             
-            if not headless:
-                # Try using system Chrome first (more stable on macOS)
-                try:
-                    self.log("Trying to use system Chrome...")
-                    self.browser = await self.playwright.chromium.launch(
-                        headless=False,
-                        channel='chrome',  # Use system Chrome if available
-                        slow_mo=500
-                    )
-                    browser_launched = True
-                    self.log("✅ Successfully launched system Chrome")
-                except Exception as e:
-                    self.log(f"System Chrome not available: {e}, trying bundled Chromium", "warning")
-            
-            if not browser_launched:
-                # Use bundled Chromium
-                try:
-                    if headless:
-                        self.browser = await self.playwright.chromium.launch(
-                            headless=True,
-                            args=['--no-sandbox', '--disable-dev-shm-usage']
-                        )
-                    else:
-                        # For visible mode - minimal args for stability
-                        self.browser = await self.playwright.chromium.launch(
-                            headless=False,
-                            slow_mo=500,
-                            args=[]  # No special args - let it use defaults
-                        )
-                    browser_launched = True
-                    self.log("✅ Successfully launched bundled Chromium")
-                except Exception as launch_error:
-                    self.log(f"Bundled Chromium launch failed: {launch_error}", "error")
-                    raise
-            
-            await asyncio.sleep(2)  # Give browser plenty of time to start
-            
-            self.log("Creating browser context...")
-            # Simple context
-            self.context = await self.browser.new_context(
-                viewport={'width': 1920, 'height': 1080},
-                user_agent='Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36'
-            )
-            await asyncio.sleep(1)
+            if CONFIG.BROWSER_USER_DATA_DIR:
+                # Persistent profile: the context is shared and outlives us
+                self.context = await BrowserPool.get_persistent_context(headless)
+                self._owns_context = False
+            else:
+                self.browser = await BrowserPool.get_browser(headless)
+                
+                self.log("Creating browser context...")
+                # Simple context
+                self.context = await self.browser.new_context(
+                    viewport=_VIEWPORT,
+                    user_agent=_USER_AGENT
+                )
+                self._owns_context = True
+                if CONFIG.BLOCK_ASSETS:
+                    await _block_assets(self.context, headless)
             
             self.log("Creating new page...")
             self.page = await self.context.new_page()
-            await asyncio.sleep(1)
+            self._content_cache = None
+            self._selector_cache.clear()
+            self.page.on("framenavigated", self._on_frame_navigated)
             
             # Verify it's working
             try:
                 current_url = self.page.url
-                self.log(f"Page created successfully. Current URL: {current_url}")
+                self.log("Page created successfully. Current URL: {url}", url=current_url)
             except Exception as e:
-                self.log(f"Warning: Could not get page URL: {str(e)}", "warning")
+                self.log("Warning: Could not get page URL: {error}", "warning", error=e)
             
             self.log("✅ Browser initialized successfully and ready!")
             return True
         except Exception as e:
-            self.log(f"Failed to initialize browser: {str(e)}", "error")
+            self.log("Failed to initialize browser: {error}", "error", error=e)
             import traceback
-            self.log(f"Traceback: {traceback.format_exc()}", "error")
+            self.log("Traceback: {traceback}", "error", traceback=traceback.format_exc())
             await self._cleanup_browser()
             return False
     
-    async def navigate_to(self, url: str) -> bool:
-        """Navigate to a specific URL."""
+    def _page_alive(self) -> bool:
+        """Whether the current page can still be driven."""
         try:
-            if not self.page:
-                await self.initialize_browser()
-            
-            # Check if page is still valid
-            try:
-                _ = self.page.url
-            except:
-                self.log("Page was closed, reinitializing browser...", "warning")
-                await self.initialize_browser()
+            return self.page is not None and not self.page.is_closed()
+        except Exception:
+            return False
+    
+    async def _reset_context(self) -> bool:
+        """Replace a dead page with a fresh context and page.
+        
+        The pooled browser is reused as is; only a crashed or disconnected
+        browser makes the pool relaunch it.
+        """
+        return await self.initialize_browser(headless=CONFIG.BROWSER_HEADLESS)
+    
+    async def navigate_to(self, url: str, ready_selector: Optional[str] = None) -> bool:
+        """Navigate to a specific URL.
+        
+        Waits for DOMContentLoaded rather than network idle (which analytics
+        and long-polling on retail sites can delay indefinitely) and then, if
+        given, for ready_selector to appear.
+        """
+        try:
+            if not self._page_alive():
+                self.log("No usable page, opening a fresh context...", "warning")
+                await self._reset_context()
             
-            self.log(f"🌐 Navigating to: {url}")
+            self.log("🌐 Navigating to: {url}", url=url)
+            self._content_cache = None
+            await self.page.goto(url, wait_until="domcontentloaded", timeout=CONFIG.PAGE_LOAD_TIMEOUT)
+            if ready_selector:
+                await self.page.wait_for_selector(ready_selector, timeout=10000)
+            if _VISUAL_DEBUG:
+                await asyncio.sleep(4)  # Wait longer so user can see the page load
             if self.action_tracker:
-                self.action_tracker.add_navigation(url)
-            await self.page.goto(url, wait_until="networkidle", timeout=60000)
-            await asyncio.sleep(4)  # Wait longer so user can see the page load
-            if self.action_tracker:
-                self.action_tracker.add_wait("load", timeout=60000)
-                self.action_tracker.add_sleep(4)
+                self.action_tracker.add_navigation(url, timeout=CONFIG.PAGE_LOAD_TIMEOUT, ready_selector=ready_selector)
             
-            # Verify page is still open
-            try:
-                current_url = self.page.url
-                self.log(f"✅ Successfully navigated to: {url} (current: {current_url})")
-            except:
-                self.log("⚠️  Page closed after navigation", "warning")
-                return False
+            self.log("✅ Successfully navigated to: {url} (current: {current_url})", url=url, current_url=self.page.url)
             return True
         except Exception as e:
-            self.log(f"Failed to navigate to {url}: {str(e)}", "error")
-            # Try to reinitialize if page was closed
-            if "closed" in str(e).lower():
-                self.log("Attempting to reinitialize browser...", "warning")
-                await self.initialize_browser()
+            self.log("Failed to navigate to {url}: {error}", "error", url=url, error=e)
+            # Leave a usable page behind if this one was closed
+            if not self._page_alive():
+                self.log("Page was closed, opening a fresh context...", "warning")
+                await self._reset_context()
             return False
     
-    async def find_element(self, selector: str, timeout: int = 10000) -> Optional[Any]:
-        """Find an element on the page."""
+    async def find_element(self, selector: str, timeout: int = 10000) -> Optional[Locator]:
+        """Find an element on the page.
+        
+        Returns a locator for the first match. Selectors already found on the
+        current document are returned without waiting again.
+        """
+        locator = self._selector_cache.get(selector)
+        if locator is not None:
+            return locator
         try:
-            element = await self.page.wait_for_selector(selector, timeout=timeout)
-            return element
+            locator = self.page.locator(selector).first
+            await locator.wait_for(state="visible", timeout=timeout)
         except Exception as e:
-            self.log(f"Element not found with selector {selector}: {str(e)}", "warning")
+            self.log("Element not found with selector {selector}: {error}", "warning", selector=selector, error=e)
             return None
+        self._selector_cache[selector] = locator
+        return locator
+    
+    async def _click_locator(self, locator: Locator, triggers_navigation: bool) -> None:
+        """Click locator and wait for the page to settle.
+        
+        With triggers_navigation, waits for the navigation the click starts
+        (up to DOMContentLoaded) instead of only the current document's state;
+        a click that turns out not to navigate is only logged.
+        """
+        self._content_cache = None
+        if not triggers_navigation:
+            await locator.click()
+            await self.page.wait_for_load_state("domcontentloaded")
+            return
+        clicked = False
+        try:
+            async with self.page.expect_navigation(wait_until="domcontentloaded", timeout=CONFIG.PAGE_LOAD_TIMEOUT):
+                await locator.click()
+                clicked = True
+        except PlaywrightTimeoutError:
+            if not clicked:
+                raise
+            self.log("Click did not start a navigation", "warning")
     
-    async def click(self, selector: str) -> bool:
-        """Click on an element."""
+    async def click(self, selector: str, triggers_navigation: bool = False) -> bool:
+        """Click on an element.
+        
+        Pass triggers_navigation for clicks that load a new page (see
+        _click_locator).
+        """
         try:
             element = await self.find_element(selector)
             if element:
-                self.log(f"🖱️  Clicking on: {selector}")
+                self.log("🖱️  Clicking on: {selector}", selector=selector)
                 if self.action_tracker:
                     self.action_tracker.add_click(selector, element_type="element")
-                await element.click()
-                await asyncio.sleep(3)  # Longer delay so user can see the action
-                if self.action_tracker:
-                    self.action_tracker.add_sleep(3)
-                self.log(f"✅ Successfully clicked!")
+                await self._click_locator(element, triggers_navigation)
+                if _VISUAL_DEBUG:
+                    await asyncio.sleep(3)  # Longer delay so user can see the action
+                self.log("✅ Successfully clicked!")
                 return True
             return False
         except Exception as e:
-            self.log(f"Failed to click on {selector}: {str(e)}", "error")
+            self.log("Failed to click on {selector}: {error}", "error", selector=selector, error=e)
             return False
     
-    async def fill_input(self, selector: str, text: str) -> bool:
-        """Fill an input field."""
+    async def click_any(self, selectors: Sequence[str], timeout: int = 10000, triggers_navigation: bool = False) -> Optional[str]:
+        """Click the first element matching any of the given selectors.
+        
+        All candidates are combined into one locator so the browser races them
+        in a single query instead of paying one timeout per selector. Pass
+        triggers_navigation for clicks that load a new page.
+        
+        Returns:
+            The combined selector that was clicked, or None if nothing matched
+        """
+        selectors = [selector for selector in selectors if selector]
+        if not selectors:
+            return None
+        
+        combined = ", ".join(selectors)
+        try:
+            # Filter to visible matches before taking the first, so a hidden
+            # duplicate earlier in the DOM cannot shadow the real control
+            locator = self.page.locator(combined).locator("visible=true").first
+            await locator.wait_for(state="visible", timeout=timeout)
+            self.log("🖱️  Clicking on: {selector}", selector=combined)
+            if self.action_tracker:
+                self.action_tracker.add_click(f"{combined} >> visible=true", element_type="element")
+            await self._click_locator(locator, triggers_navigation)
+            if _VISUAL_DEBUG:
+                await asyncio.sleep(3)  # Longer delay so user can see the action
+            self.log("✅ Successfully clicked!")
+            return combined
+        except PlaywrightTimeoutError:
+            self.log("No element found for any of: {selector}", "warning", selector=combined)
+            return None
+        except Exception as e:
+            # Most likely one of the selectors is not valid syntax (e.g. an
+            # AI-suggested ':contains'); fall back to trying them one by one.
+            self.log("Combined selector failed ({error}), trying selectors individually", "warning", error=str(e)[:100])
+            for selector in selectors:
+                if await self.click(selector, triggers_navigation):
+                    return selector
+            return None
+    
+    async def find_and_click_candidates(self, selectors: Sequence[str]) -> Optional[str]:
+        """Find and click the first matching selector in a single browser round trip.
+        
+        Only native CSS selectors are supported (no Playwright ':has-text').
+        
+        Returns:
+            The selector that was clicked, or None if nothing matched
+        """
+        try:
+            clicked = await self.page.evaluate(_FIND_AND_CLICK_JS, list(selectors))
+            if clicked:
+                self._content_cache = None
+                self.log("🖱️  Clicked in-page: {selector}", selector=clicked)
+                if self.action_tracker:
+                    self.action_tracker.add_click(clicked, element_type="element")
+            return clicked
+        except Exception as e:
+            self.log("In-page click failed: {error}", "warning", error=e)
+            return None
+    
+    async def fill_input(self, selector: str, text: str, submit: bool = False) -> bool:
+        """Fill an input field, pressing Enter afterwards if submit is set."""
         try:
             element = await self.find_element(selector)
             if element:
-                self.log(f"⌨️  Typing in {selector}: {text}")
+                self.log("⌨️  Typing in {selector}: {text}", selector=selector, text=text)
                 if self.action_tracker:
                     self.action_tracker.add_fill(selector, text)
+                    if submit:
+                        self.action_tracker.add_press(selector, "Enter")
+                self._content_cache = None
                 await element.fill(text)
-                await asyncio.sleep(2)  # Longer delay so user can see typing
-                if self.action_tracker:
-                    self.action_tracker.add_sleep(2)
-                self.log(f"✅ Successfully filled input!")
+                if submit:
+                    await element.press("Enter")
+                    await self.page.wait_for_load_state("domcontentloaded")
+                if _VISUAL_DEBUG:
+                    await asyncio.sleep(2)  # Longer delay so user can see typing
+                self.log("✅ Successfully filled input!")
                 return True
             return False
         except Exception as e:
-            self.log(f"Failed to fill input {selector}: {str(e)}", "error")
+            self.log("Failed to fill input {selector}: {error}", "error", selector=selector, error=e)
+            return False
+    
+    async def fill_batch(self, pairs: Sequence[Tuple[str, str]]) -> List[str]:
+        """Fill several inputs in a single browser round trip.
+        
+        Args:
+            pairs: (selector, value) pairs; selectors must be native CSS
+            
+        Returns:
+            Selectors that could not be filled (missing or invalid)
+        """
+        pairs = [[selector, str(value)] for selector, value in pairs]
+        if not pairs:
+            return []
+        self._content_cache = None
+        try:
+            missing = await self.page.evaluate(_FILL_BATCH_JS, pairs)
+        except Exception as e:
+            self.log("Batch fill failed: {error}", "warning", error=e)
+            return [selector for selector, _ in pairs]
+        
+        missing_set = set(missing)
+        for selector, value in pairs:
+            if selector not in missing_set:
+                self.log("⌨️  Filled {selector}: {value}", selector=selector, value=value)
+                if self.action_tracker:
+                    self.action_tracker.add_fill(selector, value)
+        return missing
+    
+    async def wait_for_stable(self, timeout: int = 3000, selector: Optional[str] = None) -> bool:
+        """Wait until the page has settled after an action.
+        
+        Waits for DOMContentLoaded and, if given, for selector to become visible.
+        Returns False if either wait timed out (the page may still be usable).
+        """
+        try:
+            await self.page.wait_for_load_state("domcontentloaded", timeout=timeout)
+            if selector:
+                await self.page.wait_for_selector(selector, state="visible", timeout=timeout)
+            return True
+        except PlaywrightTimeoutError:
             return False
     
     async def get_page_content(self) -> str:
-        """Get the current page content."""
+        """Get the current page content.
+        
+        The HTML is cached until the page navigates or is acted on, so several
+        consumers of the same page state share one DOM serialization. The full
+        HTML can run to megabytes; prefer get_text() when text is enough.
+        """
         try:
+            url = self.page.url
+            if self._content_cache and self._content_cache[0] == url:
+                return self._content_cache[1]
             content = await self.page.content()
+            self._content_cache = (url, content)
             return content
         except Exception as e:
-            self.log(f"Failed to get page content: {str(e)}", "error")
+            self.log("Failed to get page content: {error}", "error", error=e)
             return ""
     
+    async def get_text(self, selector: str = "body") -> str:
+        """Get the rendered text of the first element matching selector."""
+        try:
+            return await self.page.locator(selector).first.inner_text()
+        except Exception as e:
+            self.log("Failed to get text for {selector}: {error}", "error", selector=selector, error=e)
+            return ""
+    
+    async def get_interactive_elements(
+        self,
+        selector: str = "button, a, input:not([type='hidden']), [role='button']",
+        limit: int = 50
+    ) -> List[Dict[str, str]]:
+        """Get compact descriptors of the page's interactive elements.
+        
+        Args:
+            selector: CSS selector for the elements to describe
+            limit: Maximum number of elements to return
+            
+        Returns:
+            List of dicts with tag, text, id, classes and key attributes for
+            visible elements, those inside main/form and buttons first
+        """
+        try:
+            return await self.page.evaluate(_INTERACTIVE_ELEMENTS_JS, [selector, limit])
+        except Exception as e:
+            self.log("Failed to get interactive elements: {error}", "error", error=e)
+            return []
+    
+    async def enumerate_autocomplete_inputs(self) -> Tuple[Dict[str, str], Optional[str]]:
+        """Get form controls keyed by their autocomplete token.
+        
+        Returns:
+            Tuple of a dict mapping autocomplete tokens (e.g. "email",
+            "postal-code") to CSS selectors, and the selector of the enclosing
+            form's submit control (None if there is none)
+        """
+        try:
+            result = await self.page.evaluate(_AUTOCOMPLETE_INPUTS_JS)
+            return result["fields"], result["submit"]
+        except Exception as e:
+            self.log("Failed to enumerate autocomplete inputs: {error}", "warning", error=e)
+            return {}, None
+    
     async def get_page_url(self) -> str:
         """Get the current page URL."""
         try:
             return self.page.url
         except Exception as e:
-            self.log(f"Failed to get page URL: {str(e)}", "error")
+            self.log("Failed to get page URL: {error}", "error", error=e)
             return ""
     
-    async def take_screenshot(self, path: str = "screenshot.png") -> bool:
-        """Take a screenshot of the current page."""
+    async def _save_screenshot(self, path: str, full_page: bool) -> bool:
         try:
-            await self.page.screenshot(path=path, full_page=True)
-            self.log(f"Screenshot saved to: {path}")
+            # JPEG unless a .png path asks otherwise: far smaller buffers over CDP
+            if path.lower().endswith(".png"):
+                await self.page.screenshot(path=path, full_page=full_page)
+            else:
+                await self.page.screenshot(path=path, full_page=full_page, type="jpeg", quality=70)
+            self.log("Screenshot saved to: {path}", path=path)
             return True
         except Exception as e:
-            self.log(f"Failed to take screenshot: {str(e)}", "error")
+            self.log("Failed to take screenshot: {error}", "error", error=e)
             return False
     
+    async def take_screenshot(self, path: str = "screenshot.jpg", full_page: bool = False) -> bool:
+        """Take a screenshot of the current page.
+        
+        Viewport captures are awaited. Full-page captures (a re-layout and
+        encode of the whole document) run in the background; close() waits
+        for them before the page goes away.
+        """
+        if not full_page:
+            return await self._save_screenshot(path, full_page=False)
+        task = asyncio.create_task(self._save_screenshot(path, full_page=True))
+        self._screenshot_tasks.add(task)
+        task.add_done_callback(self._screenshot_tasks.discard)
+        return True
+    
     async def get_video_path(self) -> Optional[str]:
         """Get the path to the recorded video."""
         try:
@@ -270,7 +760,7 @@ class WebNavigatorAgent(BaseAgent):
             
             if action == "navigate":
                 url = task.get("url")
-                success = await self.navigate_to(url)
+                success = await self.navigate_to(url, task.get("ready_selector"))
                 return {
                     "status": "success" if success else "error",
                     "data": {"url": url, "current_url": await self.get_page_url()},
@@ -279,7 +769,7 @@ class WebNavigatorAgent(BaseAgent):
             
             elif action == "click":
                 selector = task.get("selector")
-                success = await self.click(selector)
+                success = await self.click(selector, triggers_navigation=bool(task.get("triggers_navigation")))
                 return {
                     "status": "success" if success else "error",
                     "data": {"selector": selector},
@@ -289,7 +779,7 @@ class WebNavigatorAgent(BaseAgent):
             elif action == "fill":
                 selector = task.get("selector")
                 text = task.get("text")
-                success = await self.fill_input(selector, text)
+                success = await self.fill_input(selector, text, submit=bool(task.get("submit")))
                 return {
                     "status": "success" if success else "error",
                     "data": {"selector": selector, "text": text},
@@ -297,7 +787,13 @@ class WebNavigatorAgent(BaseAgent):
                 }
             
             elif action == "get_content":
-                content = await self.get_page_content()
+                # Only the selected region's text when a selector is given;
+                # the full HTML otherwise
+                selector = task.get("selector")
+                if selector:
+                    content = await self.get_text(selector)
+                else:
+                    content = await self.get_page_content()
                 return {
                     "status": "success",
                     "data": {"content": content, "url": await self.get_page_url()},
@@ -312,7 +808,7 @@ class WebNavigatorAgent(BaseAgent):
                 }
         
         except Exception as e:
-            self.log(f"Error executing task: {str(e)}", "error")
+            self.log("Error executing task: {error}", "error", error=e)
             return {
                 "status": "error",
                 "data": {},
@@ -321,6 +817,8 @@ class WebNavigatorAgent(BaseAgent):
     
     async def close(self):
         """Close the browser and cleanup."""
+        if self._screenshot_tasks:
+            await asyncio.gather(*self._screenshot_tasks, return_exceptions=True)
         await self._cleanup_browser()
         self.log("Browser closed successfully")
 
@@ -0,0 +1,36 @@
+"""
+Shared API clients for the Web Scraping Agent system.
+"""
+import functools
+import httpx
+from openai import AsyncOpenAI
+from config import CONFIG
+
+
+@functools.lru_cache(maxsize=1)
+def get_openai() -> AsyncOpenAI:
+    """Return the process-wide OpenAI client, creating it on first use.
+    
+    All agents share its pooled HTTP client, so keep-alive connections (and
+    their TCP+TLS handshakes) are reused across every completion.
+    """
+    http_client = httpx.AsyncClient(
+        limits=httpx.Limits(
+            max_connections=CONFIG.OPENAI_MAX_CONNECTIONS,
+            max_keepalive_connections=CONFIG.OPENAI_MAX_KEEPALIVE_CONNECTIONS
+        ),
+        timeout=60.0
+    )
+    return AsyncOpenAI(
+        api_key=CONFIG.OPENAI_API_KEY,
+        timeout=60.0,
+        max_retries=2,
+        http_client=http_client
+    )
+
+
+async def close_openai():
+    """Close the shared OpenAI client (and its connection pool) if it was created."""
+    if get_openai.cache_info().currsize:
+        await get_openai().close()
+        get_openai.cache_clear()
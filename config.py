@@ -2,32 +2,87 @@
 Configuration management for the Web Scraping Agent system.
 """
 import os
+from dataclasses import dataclass
 from dotenv import load_dotenv
 
 load_dotenv()
 
+
+# Gitignored directory for state persisted between runs, next to this file
+# so it does not depend on the working directory
+_CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache")
+
+
+def _env_flag(name: str) -> bool:
+    return os.getenv(name, "").lower() in ("1", "true", "yes")
+
+
+@dataclass(frozen=True, slots=True)
 class Config:
-    """Application configuration."""
-    
+    """Application configuration (read it through the CONFIG instance below)."""
+
     # OpenAI Configuration
-    OPENAI_API_KEY = os.getenv("OPENAI_API_KEY", "")
-    OPENAI_MODEL = "gpt-3.5-turbo"  # Using GPT-3.5-turbo (more accessible, can change to gpt-4 if available)
-    
+    OPENAI_API_KEY: str = ""
+    OPENAI_MODEL: str = "gpt-3.5-turbo"  # Using GPT-3.5-turbo (more accessible, can change to gpt-4 if available)
+    OPENAI_EMBEDDING_MODEL: str = "text-embedding-3-small"
+    OPENAI_MAX_CONCURRENCY: int = 5  # Max OpenAI requests in flight across all agents
+    # Connection pool of the shared OpenAI HTTP client (keep-alive avoids a
+    # TCP+TLS handshake per completion)
+    OPENAI_MAX_CONNECTIONS: int = 50
+    OPENAI_MAX_KEEPALIVE_CONNECTIONS: int = 20
+
+    # Plan cache: reuse a cached task plan when a new query is this similar (cosine)
+    PLAN_CACHE_SIMILARITY: float = 0.92
+    PLAN_CACHE_MAX_SIZE: int = 128
+
     # Browser Configuration
-    BROWSER_HEADLESS = False  # Show browser so user can see what's happening
-    BROWSER_TIMEOUT = 30000  # 30 seconds
-    PAGE_LOAD_TIMEOUT = 60000  # 60 seconds
-    
+    BROWSER_HEADLESS: bool = False  # Show browser so user can see what's happening
+    BROWSER_TIMEOUT: int = 30000  # 30 seconds
+    PAGE_LOAD_TIMEOUT: int = 60000  # 60 seconds
+    # Opt-in: start Chrome ourselves and attach over CDP instead of having
+    # Playwright launch it (Chromium only)
+    USE_CDP_DIRECT: bool = False
+    CDP_PORT: int = 9222
+    CDP_USER_DATA_DIR: str = "cdp_user_data"
+    CHROME_EXECUTABLE: str = ""  # Defaults to Playwright's bundled Chromium
+    # Opt-in: keep one persistent browser profile (HTTP cache, cookies) across
+    # runs; sessions then share its single context
+    BROWSER_USER_DATA_DIR: str = ""
+    CLEAR_USER_DATA: bool = False
+    # Abort font/media (and, headless, image) requests plus known trackers
+    BLOCK_ASSETS: bool = True
+
     # Agent Configuration
-    MAX_RETRIES = 3
-    RETRY_DELAY = 2  # seconds
-    
+    MAX_RETRIES: int = 3
+    # Domains whose search box could only be found with the LLM (persisted
+    # across runs so other domains never pay for the AI lookup); entries
+    # expire so one transient failure does not mark a domain for good
+    SEARCH_AI_DOMAINS_FILE: str = os.path.join(_CACHE_DIR, "search_ai_domains.json")
+    SEARCH_AI_DOMAINS_TTL: int = 7 * 24 * 3600  # seconds
+    RETRY_DELAY: int = 2  # seconds
+
     # Logging
-    LOG_LEVEL = "INFO"
-    
+    LOG_LEVEL: str = "INFO"
+
     @classmethod
-    def validate(cls):
+    def from_env(cls) -> "Config":
+        """Build the configuration, reading each environment variable once."""
+        return cls(
+            OPENAI_API_KEY=os.getenv("OPENAI_API_KEY", ""),
+            USE_CDP_DIRECT=_env_flag("USE_CDP_DIRECT"),
+            CDP_PORT=int(os.getenv("CDP_PORT", "9222")),
+            CDP_USER_DATA_DIR=os.getenv("CDP_USER_DATA_DIR", os.path.join(os.getcwd(), "cdp_user_data")),
+            CHROME_EXECUTABLE=os.getenv("CHROME_EXECUTABLE", ""),
+            BROWSER_USER_DATA_DIR=os.getenv("BROWSER_USER_DATA_DIR", ""),
+            CLEAR_USER_DATA=_env_flag("CLEAR_USER_DATA"),
+            SEARCH_AI_DOMAINS_FILE=os.getenv("SEARCH_AI_DOMAINS_FILE", os.path.join(_CACHE_DIR, "search_ai_domains.json"))
+        )
+
+    def validate(self):
         """Validate that required configuration is present."""
-        if not cls.OPENAI_API_KEY:
+        if not self.OPENAI_API_KEY:
             raise ValueError("OPENAI_API_KEY is not set in environment variables")
 
+
+# Built once at import; every module reads settings from this instance
+CONFIG = Config.from_env()
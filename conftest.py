@@ -0,0 +1,36 @@
+"""
+Shared pytest fixtures for the generated Playwright test scripts.
+
+One browser per pytest worker (session scope) with a fresh context and page
+per test, so tests stay isolated while pytest -n auto reuses browsers.
+"""
+import os
+import pytest
+from playwright.sync_api import sync_playwright
+
+# Headless and full speed by default; HEADLESS=0 SLOW_MO=500 to watch a run
+HEADLESS = os.getenv("HEADLESS", "1") == "1"
+SLOW_MO = int(os.getenv("SLOW_MO", "0"))
+
+
+@pytest.fixture(scope="session")
+def browser():
+    with sync_playwright() as playwright:
+        browser = playwright.chromium.launch(headless=HEADLESS, slow_mo=SLOW_MO)
+        yield browser
+        browser.close()
+
+
+@pytest.fixture
+def context(browser):
+    context = browser.new_context()
+    yield context
+    context.close()
+
+
+@pytest.fixture
+def page(context):
+    page = context.new_page()
+    yield page
+    if not HEADLESS:
+        page.wait_for_timeout(5000)  # Leave the final state on screen
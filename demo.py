@@ -3,10 +3,11 @@ Demo script to show the agent working in a visible browser.
 """
 import asyncio
 import sys
-from openai import AsyncOpenAI
-from config import Config
+from config import CONFIG
+from clients import get_openai, close_openai
 from utils.logger import setup_logger
 from agents.orchestrator_agent import OrchestratorAgent
+from agents.web_navigator import BrowserPool
 
 logger = setup_logger()
 
@@ -25,13 +26,10 @@ async def demo():
         print("="*80 + "\n")
         
         # Validate configuration
-        Config.validate()
+        CONFIG.validate()
         
-        # Initialize OpenAI client
-        client = AsyncOpenAI(
-            api_key=Config.OPENAI_API_KEY,
-            timeout=60.0
-        )
+        # Shared OpenAI client; all agents reuse its connection pool
+        client = get_openai()
         
         # Get user query
         if len(sys.argv) > 1:
@@ -74,7 +72,7 @@ async def demo():
             print("📝 TEST SCRIPT GENERATED")
             print("="*80)
             print(f"Test script saved to: {test_script}")
-            print(f"You can run it with: python {test_script}")
+            print(f"You can run it with: pytest {test_script}")
             print("="*80)
         
         print("\n" + "="*80)
@@ -98,6 +96,9 @@ async def demo():
         logger.error(f"Error in demo: {str(e)}")
         print(f"\n❌ Error: {str(e)}\n")
         return None
+    finally:
+        await BrowserPool.shutdown()
+        await close_openai()
 
 if __name__ == "__main__":
     asyncio.run(demo())
@@ -3,24 +3,58 @@ Main entry point for the Web Scraping Agent system.
 """
 import asyncio
 import sys
-from openai import AsyncOpenAI
-from config import Config
+from config import CONFIG
+from clients import get_openai, close_openai
 from utils.logger import setup_logger
 from agents.orchestrator_agent import OrchestratorAgent
+from agents.web_navigator import BrowserPool
 
 logger = setup_logger()
 
+def print_result(result):
+    """Print an orchestration result and its per-step outcomes."""
+    print("\n" + "="*80)
+    print("EXECUTION RESULTS")
+    print("="*80)
+    print(f"Status: {result['status']}")
+    print(f"Message: {result['message']}")
+    print("\nExecution Details:")
+    
+    if result.get("data", {}).get("execution"):
+        execution = result["data"]["execution"]
+        if execution.get("data", {}).get("results"):
+            for step_result in execution["data"]["results"]:
+                print(f"\nStep {step_result['step']}: {step_result['agent']} - {step_result['action']}")
+                print(f"  Status: {step_result['result']['status']}")
+                print(f"  Message: {step_result['result']['message']}")
+
 async def main():
     """Main function to run the web scraping agent."""
     try:
         # Validate configuration
-        Config.validate()
+        CONFIG.validate()
+        
+        # Shared OpenAI client; all agents reuse its connection pool
+        client = get_openai()
         
-        # Initialize OpenAI client
-        client = AsyncOpenAI(
-            api_key=Config.OPENAI_API_KEY,
-            timeout=60.0
-        )
+        # Batch mode: one query per line, each run in its own browser context
+        # on the shared browser
+        if len(sys.argv) > 2 and sys.argv[1] == "--batch":
+            with open(sys.argv[2]) as f:
+                queries = [line.strip() for line in f if line.strip()]
+            logger.info(f"Starting web scraping agent with {len(queries)} queries")
+            results = await asyncio.gather(
+                *(OrchestratorAgent(client).execute({"query": query}) for query in queries),
+                return_exceptions=True
+            )
+            results = [result if isinstance(result, Exception) else result.to_dict() for result in results]
+            for query, result in zip(queries, results):
+                print(f"\nQuery: {query}")
+                if isinstance(result, Exception):
+                    print(f"Error: {result}")
+                else:
+                    print_result(result)
+            return results
         
         # Get user query
         if len(sys.argv) > 1:
@@ -37,26 +71,12 @@ async def main():
         # Initialize orchestrator agent
         orchestrator = OrchestratorAgent(client)
         
-        # Execute task
-        result = await orchestrator.execute({
+        # Execute task (returned as a plain dict for callers that serialize it)
+        result = (await orchestrator.execute({
             "query": user_query
-        })
-        
-        # Print results
-        print("\n" + "="*80)
-        print("EXECUTION RESULTS")
-        print("="*80)
-        print(f"Status: {result['status']}")
-        print(f"Message: {result['message']}")
-        print("\nExecution Details:")
+        })).to_dict()
         
-        if result.get("data", {}).get("execution"):
-            execution = result["data"]["execution"]
-            if execution.get("data", {}).get("results"):
-                for step_result in execution["data"]["results"]:
-                    print(f"\nStep {step_result['step']}: {step_result['agent']} - {step_result['action']}")
-                    print(f"  Status: {step_result['result']['status']}")
-                    print(f"  Message: {step_result['result']['message']}")
+        print_result(result)
         
         print("\n" + "="*80)
         print("\n⚠️  Browser will stay open for 10 seconds so you can see the final state...")
@@ -77,6 +97,9 @@ async def main():
         logger.error(f"Error in main: {str(e)}")
         print(f"\nError: {str(e)}")
         return None
+    finally:
+        await BrowserPool.shutdown()
+        await close_openai()
 
 if __name__ == "__main__":
     asyncio.run(main())
@@ -3,11 +3,138 @@ Playwright Test Script for Web Scraping Agent
 Tests the complete workflow: search, find product, and click image
 """
 import asyncio
+from urllib.parse import quote, urljoin
+import httpx
+import lxml.html
+from lxml import etree
 from playwright.async_api import async_playwright
+from playwright.async_api import Error as PlaywrightError, TimeoutError as PlaywrightTimeoutError
+import os
 import sys
 import re
+import weakref
 
-async def test_product_search_and_click_image(product_query="iPhone 15 Pro 256GB storage white color"):
+_IPHONE_RE = re.compile(r'iphone\s+(\d+)', re.IGNORECASE)
+
+# Apple's search results page is server-rendered, so the first product link
+# (and its image) can be read from plain HTML without a browser
+_APPLE_SEARCH_URL = "https://www.apple.com/search/{query}?src=globalnav"
+_PRODUCT_LINK_XPATH = etree.XPath("//a[contains(@href, '/shop/buy-iphone') or contains(@href, '/iphone')][@href]")
+
+# Headless and full speed unless debugging: HEADFUL=1 SLOW_MO=500
+_HEADLESS = os.environ.get("HEADFUL") != "1"
+_SLOW_MO = int(os.environ.get("SLOW_MO", "0"))
+# Opt-in HTTP-only lookup before the browser flow: FAST_PATH=1
+_FAST_PATH = os.environ.get("FAST_PATH") == "1"
+_LAUNCH_ARGS = ["--disable-gpu", "--disable-dev-shm-usage", "--no-sandbox", "--disable-blink-features=AutomationControlled"]
+
+# Only the DOM is needed; images stay on since the test clicks one by its box
+_BLOCKED_RESOURCE_TYPES = frozenset({"media", "font", "stylesheet"})
+
+# Installed on every document via add_init_script. Finds the innermost visible
+# element whose text contains all query keywords in order, walks from it to
+# the nearest <img> (itself, inside it or a sibling, up to 7 ancestors), then
+# scrolls to and clicks that image - the whole match-and-click flow in one
+# call. Returns null when nothing matches yet.
+_FIND_AND_CLICK_PRODUCT_JS = """window.__findAndClickProduct = (query) => {
+    const escape = (s) => s.replace(/[.*+?^${}()|[\\]\\\\]/g, '\\\\$&');
+    const needle = new RegExp(query.trim().split(/\\s+/).map(escape).join('.*?'), 'i');
+    const isVisible = (el) => {
+        const rect = el.getBoundingClientRect();
+        return rect.width > 0 && rect.height > 0 && getComputedStyle(el).visibility !== 'hidden';
+    };
+    const imageNear = (el) => {
+        if (el.tagName === 'IMG') return el;
+        let n = el;
+        for (let i = 0; i < 7; i++) {
+            const img = n.querySelector?.('img')
+                || n.previousElementSibling?.querySelector?.('img')
+                || n.nextElementSibling?.querySelector?.('img');
+            if (img) return img;
+            if (!n.parentElement) break;
+            n = n.parentElement;
+        }
+        return null;
+    };
+    
+    const walker = document.createTreeWalker(document.body, NodeFilter.SHOW_TEXT);
+    const seen = new Set();
+    for (let node = walker.nextNode(); node; node = walker.nextNode()) {
+        // Keywords may be split across inline children, so climb a little
+        let el = node.parentElement;
+        for (let depth = 0; el && depth < 3 && !needle.test(el.textContent); depth++) {
+            el = el.parentElement;
+        }
+        if (!el || seen.has(el) || !needle.test(el.textContent) || !isVisible(el)) continue;
+        seen.add(el);
+        const img = imageNear(el);
+        if (!img) continue;
+        img.scrollIntoView({block: 'center'});
+        const url = location.href;
+        img.click();
+        return {ok: true, text: el.textContent.trim().slice(0, 80), url};
+    }
+    return null;
+};"""
+_FIND_AND_CLICK_PRODUCT_CALL_JS = "(query) => window.__findAndClickProduct(query)"
+
+# Pages and contexts _prepare has already run on
+_prepared = weakref.WeakSet()
+
+async def _prepare(target):
+    """Install the product finder and block non-essential assets on a page or
+    context (before it loads anything)."""
+    _prepared.add(target)
+    await target.add_init_script(script=_FIND_AND_CLICK_PRODUCT_JS)
+    
+    async def handle(route):
+        if route.request.resource_type in _BLOCKED_RESOURCE_TYPES:
+            await route.abort()
+        else:
+            await route.continue_()
+    
+    await target.route("**/*", handle)
+
+def _http_client():
+    return httpx.AsyncClient(follow_redirects=True, timeout=10.0, headers={"User-Agent": "Mozilla/5.0"})
+
+async def _fast_search(search_query, client=None):
+    """Find the first product link on Apple's search page over plain HTTP.
+    
+    Pass client to reuse its connection pool across searches.
+    
+    Only links whose href (e.g. "iphone-15") or text (e.g. "iPhone 15")
+    names the searched model count, so a generic iPhone link is not taken for
+    the product.
+    
+    Returns {"url", "image"} or None when the page has no usable link (the
+    caller then falls back to the browser).
+    """
+    url = _APPLE_SEARCH_URL.format(query=quote(search_query))
+    try:
+        if client is None:
+            async with _http_client() as client:
+                response = await client.get(url)
+        else:
+            response = await client.get(url)
+        response.raise_for_status()
+    except httpx.HTTPError as e:
+        print(f"   Fast path request failed: {str(e)[:100]}")
+        return None
+    
+    model = search_query.lower()
+    slug = model.replace(" ", "-")
+    tree = lxml.html.fromstring(response.content)
+    for link in _PRODUCT_LINK_XPATH(tree):
+        text = " ".join(link.text_content().lower().split())
+        if slug not in link.get("href").lower() and model not in text:
+            continue
+        images = link.xpath(".//img/@src | ../..//img/@src")
+        if images:
+            return {"url": urljoin(url, link.get("href")), "image": urljoin(url, images[0])}
+    return None
+
+async def test_product_search_and_click_image(product_query="iPhone 15 Pro 256GB storage white color", page=None, fast_path=_FAST_PATH, http_client=None):
     """
     Test the complete product search and image clicking workflow.
     
@@ -21,6 +148,13 @@ async def test_product_search_and_click_image(product_query="iPhone 15 Pro 256GB
     7. Find image beside the product name
     8. Click on the image
     9. Verify navigation to product page
+    
+    Pass page to run on an existing page (its browser is left open; the
+    page is prepared here unless it or its context already was);
+    otherwise a browser is launched and closed for this test alone. With
+    fast_path (off unless FAST_PATH=1), the product is first looked up over plain HTTP and the
+    browser is only used if that finds nothing; http_client is the
+    httpx client it reuses, if given.
     """
     print("=" * 80)
     print("PLAYWRIGHT TEST: Product Search and Image Click")
@@ -28,7 +162,7 @@ async def test_product_search_and_click_image(product_query="iPhone 15 Pro 256GB
     print(f"\nProduct Query: {product_query}")
     
     # Extract simplified product name (e.g., "iPhone 15" from "iPhone 15 Pro 256GB...")
-    product_name_match = re.search(r'iphone\s+(\d+)', product_query.lower())
+    product_name_match = _IPHONE_RE.search(product_query)
     if product_name_match:
         search_query = f"iPhone {product_name_match.group(1)}"
     else:
@@ -36,16 +170,33 @@ async def test_product_search_and_click_image(product_query="iPhone 15 Pro 256GB
     
     print(f"Search Query: {search_query}\n")
     
-    browser = await async_playwright().start()
-    chromium = await browser.chromium.launch(headless=False, slow_mo=500)
-    page = await chromium.new_page()
+    if fast_path:
+        print("Fast path: Reading search results over HTTP...")
+        product = await _fast_search(search_query, http_client)
+        if product:
+            print(f"   Product URL: {product['url']}")
+            print(f"   Product image: {product['image']}")
+            print("\n" + "=" * 80)
+            print("TEST PASSED: Found product without a browser")
+            print("=" * 80)
+            return True
+        print("   No product link in static HTML, using the browser\n")
+    
+    owns_browser = page is None
+    if owns_browser:
+        browser = await async_playwright().start()
+        chromium = await browser.chromium.launch(headless=_HEADLESS, slow_mo=_SLOW_MO, args=_LAUNCH_ARGS)
+        page = await chromium.new_page()
+        await _prepare(page)
+    elif page not in _prepared and page.context not in _prepared:
+        # Steps 6-8 rely on the product finder _prepare installs
+        await _prepare(page)
     
     try:
         # Step 1: Navigate to Apple.com
         print("Step 1: Navigating to Apple.com...")
         await page.goto('https://www.apple.com', wait_until='networkidle')
         print(f"   Page loaded: {await page.title()}")
-        await asyncio.sleep(2)
         
         # Step 2: Click search icon (Apple.com specific)
         print("\nStep 2: Opening search menu...")
@@ -55,18 +206,16 @@ async def test_product_search_and_click_image(product_query="iPhone 15 Pro 256GB
             'a[aria-label*="Search" i]'
         ]
         
+        # One locator over all candidates: Playwright races them in the page
+        # instead of waiting out a timeout per selector
         search_icon_clicked = False
-        for selector in search_icon_selectors:
-            try:
-                icon = await page.wait_for_selector(selector, timeout=3000)
-                if icon and await icon.is_visible():
-                    await icon.click()
-                    print(f"   Clicked search icon: {selector}")
-                    await asyncio.sleep(2)
-                    search_icon_clicked = True
-                    break
-            except:
-                continue
+        try:
+            icon = page.locator(", ".join(search_icon_selectors)).first
+            await icon.click(timeout=5000)
+            print("   Clicked search icon")
+            search_icon_clicked = True
+        except (PlaywrightTimeoutError, PlaywrightError):
+            pass
         
         if not search_icon_clicked:
             print("   Warning: Search icon not found, trying direct input...")
@@ -81,24 +230,17 @@ async def test_product_search_and_click_image(product_query="iPhone 15 Pro 256GB
         ]
         
         search_success = False
-        for selector in search_input_selectors:
-            try:
-                search_input = await page.wait_for_selector(selector, timeout=5000, state='visible')
-                if search_input:
-                    print(f"   Found search input: {selector}")
-                    await search_input.click()
-                    await asyncio.sleep(0.5)
-                    await search_input.fill('')
-                    await asyncio.sleep(0.3)
-                    await search_input.fill(search_query)
-                    print(f"   Typed: {search_query}")
-                    await asyncio.sleep(1)
-                    await search_input.press('Enter')
-                    print("   Search submitted")
-                    search_success = True
-                    break
-            except:
-                continue
+        try:
+            # fill() waits for the input to be actionable, focuses it and
+            # replaces any existing value
+            search_input = page.locator(", ".join(search_input_selectors)).first
+            await search_input.fill(search_query, timeout=5000)
+            print(f"   Typed: {search_query}")
+            await search_input.press('Enter')
+            print("   Search submitted")
+            search_success = True
+        except (PlaywrightTimeoutError, PlaywrightError):
+            pass
         
         if not search_success:
             print("   Error: Could not find search input")
@@ -107,155 +249,34 @@ async def test_product_search_and_click_image(product_query="iPhone 15 Pro 256GB
         # Step 4: Wait for search results
         print("\nStep 4: Waiting for search results...")
         await page.wait_for_load_state('networkidle', timeout=10000)
-        await asyncio.sleep(2)
         current_url = page.url
         print(f"   Current URL: {current_url}")
         print(f"   Page title: {await page.title()}")
         
-        # Step 5: Read entire page content
+        # Step 5: Measure page content (in the page; the HTML never crosses CDP)
         print("\nStep 5: Reading entire page content...")
-        page_content = await page.content()
-        print(f"   Page content length: {len(page_content)} characters")
+        content_length = await page.evaluate("() => document.documentElement.outerHTML.length")
+        print(f"   Page content length: {content_length} characters")
         
-        # Step 6: Find text containing product name
+        # Steps 6-8: Find text containing product name, find the image beside
+        # it and click it - all inside the page in one call. wait_for_function
+        # re-runs the finder until results render and it has clicked.
         print(f"\nStep 6: Searching for text containing '{search_query}'...")
-        product_name_lower = search_query.lower()
-        product_keywords = product_name_lower.split()
-        
-        # XPath to find elements containing the product name
-        xpath_queries = [
-            f"//*[contains(translate(text(), 'ABCDEFGHIJKLMNOPQRSTUVWXYZ', 'abcdefghijklmnopqrstuvwxyz'), '{product_name_lower}')]",
-            f"//*[contains(translate(., 'ABCDEFGHIJKLMNOPQRSTUVWXYZ', 'abcdefghijklmnopqrstuvwxyz'), '{product_name_lower}')]",
-        ]
-        
-        matching_element = None
-        for xpath_query in xpath_queries:
-            try:
-                elements = await page.query_selector_all(f"xpath={xpath_query}")
-                print(f"   Found {len(elements)} elements containing product name")
-                
-                for element in elements[:20]:  # Check first 20 matches
-                    try:
-                        element_text = await element.text_content()
-                        element_text_lower = (element_text or "").lower()
-                        
-                        # Verify it contains all keywords
-                        if all(keyword in element_text_lower for keyword in product_keywords):
-                            print(f"   Found matching element: {element_text[:80]}...")
-                            matching_element = element
-                            break
-                    except:
-                        continue
-                
-                if matching_element:
-                    break
-            except Exception as e:
-                print(f"   XPath query failed: {str(e)[:100]}")
-                continue
-        
-        if not matching_element:
-            print("   Error: Could not find element containing product name")
-            return False
-        
-        # Step 7: Find image beside the product name
         print("\nStep 7: Finding image beside product name...")
-        image = None
-        
-        # Get element tag name
-        tag_name = await matching_element.evaluate("el => el.tagName.toLowerCase()")
-        
-        # Strategy 1: Check if element itself is an image
-        if tag_name == "img":
-            image = matching_element
-            print("   Element itself is an image")
-        
-        # Strategy 2: Check for image within the same element
-        if not image:
-            image = await matching_element.query_selector("img")
-            if image:
-                print("   Found image within element")
-        
-        # Strategy 3: Check for image in parent element
-        if not image:
-            try:
-                parent = await matching_element.evaluate_handle("el => el.parentElement")
-                if parent:
-                    image = await parent.query_selector("img")
-                    if image:
-                        print("   Found image in parent element")
-            except:
-                pass
-        
-        # Strategy 4: Check for image in grandparent element
-        if not image:
-            try:
-                grandparent = await matching_element.evaluate_handle("el => el.parentElement?.parentElement")
-                if grandparent:
-                    image = await grandparent.query_selector("img")
-                    if image:
-                        print("   Found image in grandparent element")
-            except:
-                pass
-        
-        # Strategy 5: Check for sibling images
-        if not image:
-            try:
-                prev_sibling = await matching_element.evaluate_handle("el => el.previousElementSibling")
-                if prev_sibling:
-                    prev_img = await prev_sibling.query_selector("img")
-                    if prev_img:
-                        image = prev_img
-                        print("   Found image in previous sibling")
-                
-                if not image:
-                    next_sibling = await matching_element.evaluate_handle("el => el.nextElementSibling")
-                    if next_sibling:
-                        next_img = await next_sibling.query_selector("img")
-                        if next_img:
-                            image = next_img
-                            print("   Found image in next sibling")
-            except:
-                pass
-        
-        # Strategy 6: Walk up DOM tree to find container with image
-        if not image:
-            try:
-                current = matching_element
-                for level in range(5):
-                    parent = await current.evaluate_handle("el => el.parentElement")
-                    if not parent:
-                        break
-                    
-                    parent_img = await parent.query_selector("img")
-                    if parent_img:
-                        image = parent_img
-                        print(f"   Found image in ancestor at level {level + 1}")
-                        break
-                    
-                    current = parent
-            except:
-                pass
-        
-        if not image:
-            print("   Error: Could not find image beside product name")
-            return False
-        
-        # Step 8: Click on the image
         print("\nStep 8: Clicking on product image...")
         try:
-            is_visible = await image.is_visible()
-            if not is_visible:
-                print("   Image not visible, scrolling into view...")
-                await image.scroll_into_view_if_needed()
-                await asyncio.sleep(0.5)
-            
-            await image.click()
-            print("   Image clicked")
-            await asyncio.sleep(2)
-            await page.wait_for_load_state('networkidle', timeout=10000)
-        except Exception as e:
-            print(f"   Error clicking image: {str(e)}")
+            handle = await page.wait_for_function(_FIND_AND_CLICK_PRODUCT_CALL_JS, arg=search_query, timeout=5000)
+            result = await handle.json_value()
+        except (PlaywrightTimeoutError, PlaywrightError) as e:
+            print(f"   Error: Could not find and click product image: {str(e)[:100]}")
             return False
+        print(f"   Found matching element: {result['text']}...")
+        print("   Image clicked")
+        try:
+            await page.wait_for_url(lambda url: url != result["url"], wait_until="domcontentloaded", timeout=10000)
+            await page.wait_for_load_state('networkidle', timeout=10000)
+        except (PlaywrightTimeoutError, PlaywrightError) as e:
+            print(f"   Warning: No navigation after click: {str(e)[:100]}")
         
         # Step 9: Verify navigation to product page
         print("\nStep 9: Verifying navigation to product page...")
@@ -271,9 +292,10 @@ async def test_product_search_and_click_image(product_query="iPhone 15 Pro 256GB
             print("TEST PASSED: Successfully searched and clicked product image")
             print("=" * 80)
             
-            # Wait to see the result
-            print("\nWaiting 10 seconds to view the product page...")
-            await asyncio.sleep(10)
+            # Keep the product page open for inspection until the window is closed
+            if os.getenv("KEEP_OPEN"):
+                print("\nClose the browser window to finish...")
+                await page.wait_for_event('close', timeout=0)
             
             return True
         else:
@@ -287,8 +309,9 @@ async def test_product_search_and_click_image(product_query="iPhone 15 Pro 256GB
         return False
     
     finally:
-        await chromium.close()
-        await browser.stop()
+        if owns_browser:
+            await chromium.close()
+            await browser.stop()
 
 async def test_multiple_products():
     """Test with multiple product queries."""
@@ -302,13 +325,25 @@ async def test_multiple_products():
     print("RUNNING MULTIPLE PRODUCT TESTS")
     print("=" * 80)
     
+    # One browser context and one HTTP client for all queries, so
+    # connections, HTTP cache and cookies carry over from one run to the next.
+    # Service workers are blocked so every request goes through the context's
+    # network stack (and the asset route).
     results = []
-    for query in test_queries:
-        print(f"\n\nTesting: {query}")
-        print("-" * 80)
-        result = await test_product_search_and_click_image(query)
-        results.append((query, result))
-        await asyncio.sleep(3)  # Wait between tests
+    async with async_playwright() as playwright, _http_client() as http_client:
+        browser = await playwright.chromium.launch(headless=_HEADLESS, slow_mo=_SLOW_MO, args=_LAUNCH_ARGS)
+        context = await browser.new_context(service_workers='block')
+        await _prepare(context)
+        page = await context.new_page()
+        try:
+            for query in test_queries:
+                print(f"\n\nTesting: {query}")
+                print("-" * 80)
+                result = await test_product_search_and_click_image(query, page, http_client=http_client)
+                results.append((query, result))
+                await page.goto('about:blank')
+        finally:
+            await browser.close()
     
     print("\n" + "=" * 80)
     print("TEST SUMMARY")
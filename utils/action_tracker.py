@@ -2,20 +2,52 @@
 Action Tracker - Records all actions during execution for test script generation.
 """
 from typing import List, Dict, Any
-from datetime import datetime
-import json
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+import orjson
+import time
+
+
+@dataclass(slots=True)
+class Action:
+    """One tracked browser action.
+    
+    Supports read-only dict-style get() over type, timestamp_ns and the
+    action's data, so consumers written against the old action dicts keep
+    working; use to_dict() where a real dict is needed.
+    """
+    type: str
+    timestamp_ns: int
+    data: Dict[str, Any] = field(default_factory=dict)
+    
+    def get(self, key: str, default: Any = None) -> Any:
+        if key == "type":
+            return self.type
+        if key == "timestamp_ns":
+            return self.timestamp_ns
+        return self.data.get(key, default)
+    
+    def to_dict(self) -> Dict[str, Any]:
+        return {"type": self.type, "timestamp_ns": self.timestamp_ns, **self.data}
+
 
 class ActionTracker:
     """Tracks all browser actions for test script generation."""
     
     def __init__(self):
-        self.actions: List[Dict[str, Any]] = []
+        self.actions: List[Action] = []
         self.start_time = None
         self.end_time = None
+        # Actions are stamped with perf_counter_ns() offsets from this origin
+        # and only turned into wall-clock times on export
+        self._t0 = time.perf_counter_ns()
+        self._t0_time = datetime.now()
     
     def start(self):
         """Start tracking actions."""
         self.start_time = datetime.now()
+        self._t0 = time.perf_counter_ns()
+        self._t0_time = self.start_time
         self.actions = []
     
     def stop(self):
@@ -24,28 +56,23 @@ class ActionTracker:
     
     def add_action(self, action_type: str, **kwargs):
         """Add an action to the tracker."""
-        action = {
-            "type": action_type,
-            "timestamp": datetime.now().isoformat(),
-            **kwargs
-        }
-        self.actions.append(action)
+        self.actions.append(Action(action_type, time.perf_counter_ns() - self._t0, kwargs))
     
-    def add_navigation(self, url: str):
-        """Track navigation action."""
-        self.add_action("navigate", url=url)
+    def add_navigation(self, url: str, timeout: int = None, ready_selector: str = None):
+        """Track navigation action, including the wait for the page to be ready."""
+        self.add_action("navigate", url=url, timeout=timeout, ready_selector=ready_selector)
     
-    def add_click(self, selector: str, element_type: str = "element"):
-        """Track click action."""
-        self.add_action("click", selector=selector, element_type=element_type)
+    def add_click(self, selector: str, element_type: str = "element", wait_for_load: int = None):
+        """Track click action; wait_for_load is the timeout of the page load it triggers."""
+        self.add_action("click", selector=selector, element_type=element_type, wait_for_load=wait_for_load)
     
     def add_fill(self, selector: str, text: str):
         """Track fill input action."""
         self.add_action("fill", selector=selector, text=text)
     
-    def add_press(self, selector: str, key: str):
-        """Track key press action."""
-        self.add_action("press", selector=selector, key=key)
+    def add_press(self, selector: str, key: str, wait_for_load: int = None):
+        """Track key press action; wait_for_load is the timeout of the page load it triggers."""
+        self.add_action("press", selector=selector, key=key, wait_for_load=wait_for_load)
     
     def add_wait(self, wait_type: str, timeout: int = None, selector: str = None):
         """Track wait action."""
@@ -55,7 +82,7 @@ class ActionTracker:
         """Track sleep action."""
         self.add_action("sleep", seconds=seconds)
     
-    def get_actions(self) -> List[Dict[str, Any]]:
+    def get_actions(self) -> List[Action]:
         """Get all tracked actions."""
         return self.actions
     
@@ -64,10 +91,13 @@ class ActionTracker:
         data = {
             "start_time": self.start_time.isoformat() if self.start_time else None,
             "end_time": self.end_time.isoformat() if self.end_time else None,
-            "actions": self.actions
+            "actions": [
+                {**action.to_dict(), "timestamp": (self._t0_time + timedelta(microseconds=action.timestamp_ns / 1000)).isoformat()}
+                for action in self.actions
+            ]
         }
-        with open(filepath, 'w') as f:
-            json.dump(data, f, indent=2)
+        with open(filepath, 'wb') as f:
+            f.write(orjson.dumps(data, option=orjson.OPT_INDENT_2))
     
     def clear(self):
         """Clear all tracked actions."""
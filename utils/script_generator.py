@@ -1,143 +1,200 @@
 """
 Script Generator - Generates Playwright test scripts from tracked actions.
 """
-from typing import List, Dict, Any
+from typing import Dict, Any, Iterator, Mapping, Optional, Sequence, Set
 from datetime import datetime
 import os
 
+# Code emitted per step, filled in with str.format: {i} is the indent, {n} the
+# step number and {sel} the step's selector constant. Step templates end with
+# the blank line that separates them.
+_TEMPLATES = {
+    "navigate": (
+        '{i}# Step {n}: Navigate to {url}\n'
+        '{i}page.goto({url!r}, wait_until="domcontentloaded"{timeout_arg})\n'
+    ),
+    "navigate_ready": '{i}page.locator({sel}).first.wait_for(timeout=10000)\n',
+    "click_image": (
+        '{i}# Step {n}: Click {element_type}\n'
+        '{i}# Click the first visible image (filtered in the browser)\n'
+        '{i}page.locator("img >> visible=true").first.click()\n'
+        '{i}page.wait_for_load_state("domcontentloaded", timeout={load_timeout})\n'
+        '\n'
+    ),
+    "click": (
+        '{i}# Step {n}: Click {element_type}\n'
+        '{i}page.locator({sel}).first.click(timeout=5000)\n'
+        '{i}page.wait_for_load_state("domcontentloaded", timeout={load_timeout})\n'
+        '\n'
+    ),
+    # fill() focuses the field itself
+    "fill": (
+        '{i}# Step {n}: Fill input field\n'
+        '{i}page.locator({sel}).first.fill({text!r})\n'
+        '\n'
+    ),
+    "fill_submit": (
+        "{i}# Step {n}: Fill input field and press '{key}'\n"
+        '{i}page.locator({sel}).first.fill({text!r})\n'
+        '{i}page.locator({sel}).first.press({key!r})\n'
+        '{i}page.wait_for_load_state("domcontentloaded", timeout={load_timeout})\n'
+        '\n'
+    ),
+    "press": (
+        "{i}# Step {n}: Press key '{key}'\n"
+        '{i}page.locator({sel}).first.press({key!r}, timeout=5000)\n'
+        '{i}page.wait_for_load_state("domcontentloaded", timeout={load_timeout})\n'
+        '\n'
+    ),
+    "wait_load": (
+        '{i}# Step {n}: Wait for page load\n'
+        '{i}page.wait_for_load_state("domcontentloaded", timeout={timeout})\n'
+        '\n'
+    ),
+    "wait_selector": (
+        '{i}# Step {n}: Wait for selector\n'
+        '{i}page.locator({sel}).first.wait_for(timeout={timeout})\n'
+        '\n'
+    ),
+    "sleep": (
+        '{i}# Step {n}: Wait {seconds} seconds\n'
+        '{i}page.wait_for_timeout({ms})\n'
+        '\n'
+    ),
+    "footer": (
+        '{i}print(f"Final URL: {{page.url}}")\n'
+        '{i}print(f"Final title: {{page.title()}}")\n'
+    ),
+}
+
+_INDENT = "    "
+
 class PlaywrightScriptGenerator:
     """Generates Playwright test scripts from tracked actions."""
     
-    def __init__(self, actions: List[Dict[str, Any]], query: str = ""):
+    def __init__(self, actions: Sequence[Mapping[str, Any]], query: str = ""):
         self.actions = actions
         self.query = query
     
-    def generate(self) -> str:
-        """Generate the Playwright test script."""
-        lines = []
+    def _selector_constants(self) -> Dict[str, str]:
+        """Map each distinct selector used by the actions to a constant name."""
+        constants = {}
+        for action in self.actions:
+            if action.get("type") == "click" and "image" in action.get("element_type", "element").lower():
+                continue
+            for key in ("selector", "ready_selector"):
+                selector = action.get(key)
+                if selector and selector not in constants:
+                    constants[selector] = f"SELECTOR_{len(constants) + 1}"
+        return constants
+    
+    def _render_step(self, index: int, selectors: Dict[str, str], submitted: Set[int]) -> Optional[str]:
+        """Render the code for self.actions[index] (None if it emits nothing)."""
+        action = self.actions[index]
+        action_type = action.get("type")
+        selector = action.get("selector")
+        step = {"i": _INDENT, "n": index + 1, "sel": selectors.get(selector)}
+        
+        if action_type == "navigate":
+            timeout = action.get("timeout")
+            ready_selector = action.get("ready_selector")
+            code = _TEMPLATES["navigate"].format(
+                url=action.get("url", ""),
+                timeout_arg=f", timeout={timeout}" if timeout else "",
+                **step
+            )
+            if ready_selector:
+                code += _TEMPLATES["navigate_ready"].format(i=_INDENT, sel=selectors[ready_selector])
+            return code + "\n"
+        
+        elif action_type == "click":
+            element_type = action.get("element_type", "element")
+            # Product images are clicked by visibility, not by the recorded selector
+            template = "click_image" if "image" in element_type.lower() else "click"
+            return _TEMPLATES[template].format(
+                element_type=element_type,
+                load_timeout=action.get("wait_for_load") or 10000,
+                **step
+            )
+        
+        elif action_type == "fill":
+            text = action.get("text", "")
+            next_action = self.actions[index + 1] if index + 1 < len(self.actions) else {}
+            # A following key press on the same field is emitted right after
+            # the fill as one fill-and-submit step
+            if next_action.get("type") == "press" and next_action.get("selector") == selector:
+                submitted.add(index + 1)
+                return _TEMPLATES["fill_submit"].format(
+                    text=text,
+                    key=next_action.get("key", "Enter"),
+                    load_timeout=next_action.get("wait_for_load") or 10000,
+                    **step
+                )
+            return _TEMPLATES["fill"].format(text=text, **step)
+        
+        elif action_type == "press" and index not in submitted:
+            return _TEMPLATES["press"].format(
+                key=action.get("key", "Enter"),
+                load_timeout=action.get("wait_for_load") or 10000,
+                **step
+            )
+        
+        elif action_type == "wait":
+            wait_type = action.get("wait_type", "load")
+            timeout = action.get("timeout", 10000)
+            if wait_type == "load":
+                return _TEMPLATES["wait_load"].format(timeout=timeout, **step)
+            elif wait_type == "selector" and selector:
+                return _TEMPLATES["wait_selector"].format(timeout=timeout, **step)
+            return "\n"
+        
+        elif action_type == "sleep":
+            seconds = action.get("seconds", 1)
+            return _TEMPLATES["sleep"].format(seconds=seconds, ms=int(seconds * 1000), **step)
+        
+        return None
+    
+    def _iter_lines(self) -> Iterator[str]:
+        """Yield the script in newline-terminated pieces, header to footer."""
+        selectors = self._selector_constants()
         
         # Header
-        lines.append('"""')
-        lines.append(f"Auto-generated Playwright test script")
-        lines.append(f"Generated from execution on: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
+        yield '"""\n'
+        yield "Auto-generated Playwright test script\n"
+        yield f"Generated from execution on: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n"
         if self.query:
-            lines.append(f"Original query: {self.query}")
-        lines.append('"""')
-        lines.append("import asyncio")
-        lines.append("from playwright.async_api import async_playwright")
-        lines.append("")
-        lines.append("")
-        lines.append("async def test_auto_generated():")
-        lines.append('    """Auto-generated test based on actual execution."""')
-        lines.append("    browser = await async_playwright().start()")
-        lines.append("    chromium = await browser.chromium.launch(headless=False, slow_mo=500)")
-        lines.append("    page = await chromium.new_page()")
-        lines.append("")
-        lines.append("    try:")
+            yield f"Original query: {self.query}\n"
+        yield "\n"
+        yield "Run with pytest; the browser/context/page fixtures come from conftest.py\n"
+        yield "(pytest -n auto runs many generated tests in parallel).\n"
+        yield '"""\n'
+        yield "from playwright.sync_api import Page\n"
+        if selectors:
+            yield "\n"
+            yield "# Selectors used by the steps below\n"
+            for selector, name in selectors.items():
+                yield f"{name} = {selector!r}\n"
+        yield "\n"
+        yield "\n"
+        yield "def test_auto_generated(page: Page):\n"
+        yield '    """Auto-generated test based on actual execution."""\n'
         
         # Generate actions
-        indent = "        "
-        for i, action in enumerate(self.actions):
-            action_type = action.get("type")
-            
-            if action_type == "navigate":
-                url = action.get("url", "")
-                lines.append(f"{indent}# Step {i+1}: Navigate to {url}")
-                lines.append(f'{indent}await page.goto("{url}", wait_until="networkidle")')
-                lines.append(f'{indent}await asyncio.sleep(2)')
-                lines.append("")
-            
-            elif action_type == "click":
-                selector = action.get("selector", "")
-                element_type = action.get("element_type", "element")
-                
-                # Special handling for product images - use XPath or more flexible selectors
-                if "product_image" in element_type or "image" in element_type.lower():
-                    lines.append(f"{indent}# Step {i+1}: Click {element_type}")
-                    lines.append(f'{indent}# Find product image (using flexible selector)')
-                    lines.append(f'{indent}images = await page.query_selector_all("img")')
-                    lines.append(f'{indent}for img in images:')
-                    lines.append(f'{indent}    try:')
-                    lines.append(f'{indent}        is_visible = await img.is_visible()')
-                    lines.append(f'{indent}        if is_visible:')
-                    lines.append(f'{indent}            await img.scroll_into_view_if_needed()')
-                    lines.append(f'{indent}            await img.click()')
-                    lines.append(f'{indent}            break')
-                    lines.append(f'{indent}    except:')
-                    lines.append(f'{indent}        continue')
-                    lines.append(f'{indent}await asyncio.sleep(2)')
-                    lines.append(f'{indent}await page.wait_for_load_state("networkidle", timeout=10000)')
-                    lines.append("")
-                else:
-                    lines.append(f"{indent}# Step {i+1}: Click {element_type}")
-                    lines.append(f'{indent}element = await page.wait_for_selector("{selector}", timeout=5000)')
-                    lines.append(f'{indent}await element.click()')
-                    lines.append(f'{indent}await asyncio.sleep(1)')
-                    lines.append("")
-            
-            elif action_type == "fill":
-                selector = action.get("selector", "")
-                text = action.get("text", "")
-                lines.append(f"{indent}# Step {i+1}: Fill input field")
-                lines.append(f'{indent}input = await page.wait_for_selector("{selector}", timeout=5000, state="visible")')
-                lines.append(f'{indent}await input.click()')
-                lines.append(f'{indent}await input.fill("")')
-                lines.append(f'{indent}await input.fill("{text}")')
-                lines.append(f'{indent}await asyncio.sleep(0.5)')
-                lines.append("")
-            
-            elif action_type == "press":
-                selector = action.get("selector", "")
-                key = action.get("key", "Enter")
-                lines.append(f"{indent}# Step {i+1}: Press key '{key}'")
-                lines.append(f'{indent}element = await page.wait_for_selector("{selector}", timeout=5000)')
-                lines.append(f'{indent}await element.press("{key}")')
-                lines.append(f'{indent}await asyncio.sleep(1)')
-                lines.append("")
-            
-            elif action_type == "wait":
-                wait_type = action.get("wait_type", "load")
-                timeout = action.get("timeout", 10000)
-                selector = action.get("selector")
-                
-                if wait_type == "load":
-                    lines.append(f"{indent}# Step {i+1}: Wait for page load")
-                    lines.append(f'{indent}await page.wait_for_load_state("networkidle", timeout={timeout})')
-                elif wait_type == "selector" and selector:
-                    lines.append(f"{indent}# Step {i+1}: Wait for selector")
-                    lines.append(f'{indent}await page.wait_for_selector("{selector}", timeout={timeout})')
-                lines.append("")
-            
-            elif action_type == "sleep":
-                seconds = action.get("seconds", 1)
-                lines.append(f"{indent}# Step {i+1}: Wait {seconds} seconds")
-                lines.append(f'{indent}await asyncio.sleep({seconds})')
-                lines.append("")
+        submitted: Set[int] = set()  # Indexes of presses already emitted with their fill
+        for index in range(len(self.actions)):
+            step = self._render_step(index, selectors, submitted)
+            if step:
+                yield step
         
         # Footer
-        lines.append(f"{indent}print('Test completed successfully')")
-        lines.append(f'{indent}print(f"Final URL: {{page.url}}")')
-        lines.append(f'{indent}print(f"Final title: {{await page.title()}}")')
-        lines.append(f'{indent}await asyncio.sleep(5)')
-        lines.append("")
-        lines.append("    except Exception as e:")
-        lines.append('        print(f"Test failed: {str(e)}")')
-        lines.append("        import traceback")
-        lines.append("        traceback.print_exc()")
-        lines.append("")
-        lines.append("    finally:")
-        lines.append("        await chromium.close()")
-        lines.append("        await browser.stop()")
-        lines.append("")
-        lines.append("")
-        lines.append('if __name__ == "__main__":')
-        lines.append("    asyncio.run(test_auto_generated())")
-        
-        return "\n".join(lines)
+        yield _TEMPLATES["footer"].format(i=_INDENT)
+    
+    def generate(self) -> str:
+        """Generate the Playwright test script."""
+        return "".join(self._iter_lines())
     
     def save(self, filepath: str):
-        """Save the generated script to a file."""
-        script_content = self.generate()
+        """Save the generated script to a file, streaming it piece by piece."""
         with open(filepath, 'w') as f:
-            f.write(script_content)
+            f.writelines(self._iter_lines())
         return filepath